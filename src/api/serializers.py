@@ -0,0 +1,23 @@
+from collections.abc import Mapping
+
+from rest_framework import serializers
+
+from las.services.tools.receipt_number import ReceiptNumberEntity, ReceiptNumberResolver
+
+
+class ReceiptNumberListSerializer(serializers.ListSerializer):
+    # Номера квитанций всего массива разрешаются пакетно до валидации элементов
+    receipt_number_resolver = None
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.receipt_number_resolver = ReceiptNumberResolver(
+                receipt_numbers=[item.get('receipt_number') for item in data if isinstance(item, Mapping)],
+                metadata_only=True,
+            )
+        return super().to_internal_value(data)
+
+    def get_receipt_number_entity(self, receipt_number: str) -> ReceiptNumberEntity:
+        if self.receipt_number_resolver is None:
+            return ReceiptNumberEntity(receipt_number=receipt_number)
+        return self.receipt_number_resolver.get_entity(receipt_number=receipt_number)
@@ -1,6 +1,8 @@
 from django.urls import path, include
 
 from ..views import (
+    BalanceAsOfAPIView,
+    BalanceCurrentAPIView,
     RegisterAddAPIView,
     RegisterCancelAPIView,
     RegisterEditAPIView,
@@ -12,4 +14,7 @@ urlpatterns = [
     path('register/add/', RegisterAddAPIView.as_view(), name='register_add'),
     path('register/cancel/', RegisterCancelAPIView.as_view(), name='register_cancel'),
     path('register/edit/', RegisterEditAPIView.as_view(), name='register_edit'),
+
+    path('balance/current/', BalanceCurrentAPIView.as_view(), name='balance_current'),
+    path('balance/as-of/', BalanceAsOfAPIView.as_view(), name='balance_as_of'),
 ]
@@ -1,3 +1,9 @@
-urlpatterns = [
+from django.urls import path
+
+from ..views import (
+    LockMetricsAPIView,
+)
 
+urlpatterns = [
+    path('metrics/locks/', LockMetricsAPIView.as_view(), name='lock_metrics'),
 ]
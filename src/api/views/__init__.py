@@ -1,3 +1,12 @@
+from .balance_as_of.views import (
+    BalanceAsOfAPIView,
+)
+from .balance_current.views import (
+    BalanceCurrentAPIView,
+)
+from .lock_metrics.views import (
+    LockMetricsAPIView,
+)
 from .register_add.views import (
     RegisterAddAPIView,
 )
@@ -0,0 +1,49 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from api.validators import is_digit
+
+
+class BalanceAsOfInputSerializer(serializers.Serializer):
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
+
+    subject_ogrn = serializers.CharField(
+        max_length=15,
+        help_text=_('ОГРН (ОГРНИП) субъекта накопления'),
+        validators=[is_digit],
+    )
+    accumulation_section_ids = serializers.ListField(
+        help_text=_('Идентификаторы (в сервисе) видов обязательств. Если не переданы - все виды обязательств инстанции'),
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        required=False,
+    )
+    moment = serializers.DateTimeField(
+        help_text=_('Момент времени, на который требуется суммарный размер обязательств'),
+    )
+
+
+class BalanceAsOfResponseSerializer(serializers.Serializer):
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
+
+    accumulation_section_id = serializers.IntegerField(
+        help_text=_('Идентификатор (в сервисе) вида обязательств'),
+    )
+    postfix = serializers.CharField(
+        max_length=32,
+        help_text=_('Символьный идентификатор вида обязательств'),
+    )
+    amount_total = serializers.DecimalField(
+        max_digits=17,
+        decimal_places=2,
+        help_text=_('Суммарный размер обязательств данного клиента в данном виде обязательств '
+                    'по состоянию на указанный момент времени'),
+    )
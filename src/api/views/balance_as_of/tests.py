@@ -0,0 +1,123 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils.translation import gettext
+
+from api.tests import BaseAPITestCase
+from las.factories import LiabilitiesTypeFactory
+from las.models import AccumulationRegister
+from las.models.liabilities_type import TypeRunningChoices
+from las.test_mixin import TestsMixin
+
+
+class BalanceAsOfAPIViewAPITestCase(TestsMixin, BaseAPITestCase):
+    url_name = 'balance_as_of'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.liability_internal_accounting = LiabilitiesTypeFactory(
+            instance=cls.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        cls.liability_without_records = LiabilitiesTypeFactory(
+            instance=cls.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        added = cls.add_to_register(
+            user=cls.user,
+            liabilities_type=cls.liability_internal_accounting,
+            subject_accumulation=cls.subject_accumulation,
+            amounts=[Decimal('1000.00'), Decimal('2000.00'), Decimal('3500.00')],
+        )
+        for day, increment_result in enumerate(added, start=1):
+            AccumulationRegister.objects.filter(
+                receipt_number=increment_result['receipt_number'],
+            ).update(
+                created_at=datetime(2021, 11, day, 12, 0),
+            )
+
+    def test_bad_request(self):
+        response = self.client.post(
+            self.url(),
+            data={},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertDictEqual(
+            response.json(),
+            {
+                'subject_ogrn': [gettext('Обязательное поле.')],
+                'moment': [gettext('Обязательное поле.')],
+            }
+        )
+
+    def test_success(self):
+        response = self.post(
+            payload={
+                'subject_ogrn': self.ogrn,
+                'moment': '2021-11-02T18:00:00',
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json(),
+            [
+                {
+                    'accumulation_section_id': self.liability_internal_accounting.id,
+                    'postfix': self.liability_internal_accounting.postfix,
+                    'amount_total': 3000.0,
+                },
+                {
+                    'accumulation_section_id': self.liability_without_records.id,
+                    'postfix': self.liability_without_records.postfix,
+                    'amount_total': 0.0,
+                },
+            ]
+        )
+
+    def test_success_before_first_record(self):
+        response = self.post(
+            payload={
+                'subject_ogrn': self.ogrn,
+                'accumulation_section_ids': [self.liability_internal_accounting.id],
+                'moment': '2021-10-31T00:00:00',
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json(),
+            [
+                {
+                    'accumulation_section_id': self.liability_internal_accounting.id,
+                    'postfix': self.liability_internal_accounting.postfix,
+                    'amount_total': 0.0,
+                },
+            ]
+        )
+
+    def test_success_same_created_at(self):
+        # Записи с одинаковым временем создания: остаток берётся из последней записи цепочки
+        AccumulationRegister.objects.filter(
+            liabilities_type=self.liability_internal_accounting,
+        ).update(
+            created_at=datetime(2021, 11, 1, 12, 0),
+        )
+        response = self.post(
+            payload={
+                'subject_ogrn': self.ogrn,
+                'accumulation_section_ids': [self.liability_internal_accounting.id],
+                'moment': '2021-11-01T18:00:00',
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertListEqual(
+            response.json(),
+            [
+                {
+                    'accumulation_section_id': self.liability_internal_accounting.id,
+                    'postfix': self.liability_internal_accounting.postfix,
+                    'amount_total': 6500.0,
+                },
+            ]
+        )
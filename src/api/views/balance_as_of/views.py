@@ -0,0 +1,56 @@
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.permissions import HasInstance
+from api.yasg.schemas import LASAutoSchema
+from las.services.las import LiabilityAccountingSystem
+from .serializers import (
+    BalanceAsOfInputSerializer,
+    BalanceAsOfResponseSerializer,
+)
+
+
+@method_decorator(name='post', decorator=swagger_auto_schema(
+    operation_description=_('Метод получения суммарного размера обязательств субъекта накопления '
+                            'по состоянию на момент времени.'),
+    request_body=BalanceAsOfInputSerializer,
+    responses={
+        200: BalanceAsOfResponseSerializer(_('Суммарный размер обязательств'), many=True),
+    },
+    operation_id='balance_as_of',
+))
+class BalanceAsOfAPIView(APIView):
+    http_method_names = ['post']
+    parser_classes = (JSONParser,)
+    renderer_classes = (JSONRenderer,)
+    authentication_classes = (JWTAuthentication,)
+    permission_classes = (IsAuthenticated, HasInstance,)
+    swagger_schema = LASAutoSchema
+    request_serializer_class = BalanceAsOfInputSerializer
+    response_serializer_class = BalanceAsOfResponseSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.request_serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        amount_totals = LiabilityAccountingSystem(
+            user=request.user,
+        ).get_amount_totals_as_of(
+            subject_ogrn=serializer.validated_data['subject_ogrn'],
+            moment=serializer.validated_data['moment'],
+            liabilities_type_ids=serializer.validated_data.get('accumulation_section_ids'),
+        )
+        response_serializer = self.response_serializer_class(data=amount_totals, many=True)
+        response_serializer.is_valid(raise_exception=True)
+
+        return Response(
+            data=response_serializer.validated_data,
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from api.validators import is_digit
+
+
+class BalanceCurrentInputSerializer(serializers.Serializer):
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
+
+    subject_ogrns = serializers.ListField(
+        help_text=_('ОГРН (ОГРНИП) субъектов накопления'),
+        child=serializers.CharField(
+            max_length=15,
+            validators=[is_digit],
+        ),
+        allow_empty=False,
+        max_length=settings.LAS_BALANCE_BULK_MAX_SUBJECTS,
+    )
+    accumulation_section_ids = serializers.ListField(
+        help_text=_('Идентификаторы (в сервисе) видов обязательств. Если не переданы - все виды обязательств инстанции'),
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        required=False,
+    )
+
+
+class BalanceCurrentResponseSerializer(serializers.Serializer):
+    def update(self, instance, validated_data):
+        pass
+
+    def create(self, validated_data):
+        pass
+
+    subject_ogrn = serializers.CharField(
+        max_length=15,
+        help_text=_('ОГРН (ОГРНИП) субъекта накопления'),
+    )
+    accumulation_section_id = serializers.IntegerField(
+        help_text=_('Идентификатор (в сервисе) вида обязательств'),
+    )
+    postfix = serializers.CharField(
+        max_length=32,
+        help_text=_('Символьный идентификатор вида обязательств'),
+    )
+    amount_total = serializers.DecimalField(
+        max_digits=17,
+        decimal_places=2,
+        help_text=_('Текущий суммарный размер обязательств данного клиента в данном виде обязательств'),
+    )
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.utils.translation import gettext
+
+from api.tests import BaseAPITestCase
+from las.factories import (
+    LiabilitiesTypeFactory,
+    SubjectAccumulationFactory,
+    UserFactory,
+)
+from las.models.liabilities_type import TypeRunningChoices
+from las.services.tools.subject_accumulation import SubjectAccumulationManager
+from las.test_mixin import TestsMixin
+
+
+class BalanceCurrentAPIViewAPITestCase(TestsMixin, BaseAPITestCase):
+    url_name = 'balance_current'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.liability_internal_accounting = LiabilitiesTypeFactory(
+            instance=cls.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        cls.other_subject_accumulation = SubjectAccumulationManager.transform(
+            model_instance=SubjectAccumulationFactory(),
+        )
+        cls.add_to_register(
+            user=cls.user,
+            liabilities_type=cls.liability_internal_accounting,
+            subject_accumulation=cls.subject_accumulation,
+            amounts=[Decimal('1000.00'), Decimal('2000.00')],
+        )
+        cls.add_to_register(
+            user=cls.user,
+            liabilities_type=cls.liability_internal_accounting,
+            subject_accumulation=cls.other_subject_accumulation,
+            amounts=[Decimal('500.00')],
+        )
+        other_user = UserFactory()
+        cls.add_to_register(
+            user=other_user,
+            liabilities_type=LiabilitiesTypeFactory(
+                instance=other_user.instance,
+                type_running=TypeRunningChoices.INTERNAL.value[0],
+            ),
+            subject_accumulation=cls.subject_accumulation,
+            amounts=[Decimal('7000.00')],
+        )
+
+    def test_bad_request(self):
+        response = self.post(
+            payload={
+                'subject_ogrns': [],
+            },
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertDictEqual(
+            response.json(),
+            {
+                'subject_ogrns': [gettext('Этот список не может быть пустым.')],
+            }
+        )
+
+    def test_success(self):
+        subject_ogrns = sorted([
+            self.subject_accumulation.external_id,
+            self.other_subject_accumulation.external_id,
+        ])
+        response = self.post(
+            payload={
+                'subject_ogrns': subject_ogrns + ['1111111111111'],
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        amount_totals = {
+            self.subject_accumulation.external_id: 3000.0,
+            self.other_subject_accumulation.external_id: 500.0,
+        }
+        self.assertListEqual(
+            response.json(),
+            [
+                {
+                    'subject_ogrn': subject_ogrn,
+                    'accumulation_section_id': self.liability_internal_accounting.id,
+                    'postfix': self.liability_internal_accounting.postfix,
+                    'amount_total': amount_totals[subject_ogrn],
+                }
+                for subject_ogrn in subject_ogrns
+            ]
+        )
@@ -0,0 +1,54 @@
+from django.utils.decorators import method_decorator
+from django.utils.translation import gettext_lazy as _
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.parsers import JSONParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.permissions import HasInstance
+from api.yasg.schemas import LASAutoSchema
+from las.services.las import LiabilityAccountingSystem
+from .serializers import (
+    BalanceCurrentInputSerializer,
+    BalanceCurrentResponseSerializer,
+)
+
+
+@method_decorator(name='post', decorator=swagger_auto_schema(
+    operation_description=_('Метод получения текущего суммарного размера обязательств по списку субъектов накопления. '
+                            'Субъекты без учтённых обязательств в ответ не попадают.'),
+    request_body=BalanceCurrentInputSerializer,
+    responses={
+        200: BalanceCurrentResponseSerializer(_('Текущий суммарный размер обязательств'), many=True),
+    },
+    operation_id='balance_current',
+))
+class BalanceCurrentAPIView(APIView):
+    http_method_names = ['post']
+    parser_classes = (JSONParser,)
+    renderer_classes = (JSONRenderer,)
+    authentication_classes = (JWTAuthentication,)
+    permission_classes = (IsAuthenticated, HasInstance,)
+    swagger_schema = LASAutoSchema
+    request_serializer_class = BalanceCurrentInputSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.request_serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        amount_totals = LiabilityAccountingSystem(
+            user=request.user,
+        ).get_current_amount_totals(
+            subject_ogrns=serializer.validated_data['subject_ogrns'],
+            liabilities_type_ids=serializer.validated_data.get('accumulation_section_ids'),
+        )
+
+        # Ответ может содержать десятки тысяч строк, которые уже приведены к типам модели,
+        # поэтому повторная валидация ответным сериализатором не выполняется
+        return Response(
+            data=amount_totals,
+            status=status.HTTP_200_OK,
+        )
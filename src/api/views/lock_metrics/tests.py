@@ -0,0 +1,39 @@
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from las.factories import UserFactory
+from las.services.lock_metrics import lock_metrics
+from las.services.locks import AdvisoryLock
+
+
+class LockMetricsAPIViewAPITestCase(APITestCase):
+    def setUp(self):
+        lock_metrics.reset()
+
+    def test_permissions(self):
+        response = self.client.get(reverse('lock_metrics'))
+        self.assertIn(response.status_code, (401, 403))
+
+        self.client.force_authenticate(user=UserFactory())
+        response = self.client.get(reverse('lock_metrics'))
+        self.assertEqual(response.status_code, 403)
+
+    def test_lock_metrics(self):
+        with self.settings(LAS_LOCK_CONTENDED_WAIT=0):
+            with AdvisoryLock(instance_id=1, subject_id='1023301286656'):
+                pass
+
+        self.client.force_authenticate(user=UserFactory(is_staff=True))
+        response = self.client.get(reverse('lock_metrics'))
+        self.assertEqual(response.status_code, 200)
+        locks = response.json()['locks']
+        self.assertEqual(locks['acquisitions'], 1)
+        self.assertEqual(locks['wait']['count'], 1)
+        self.assertEqual(locks['hold']['count'], 1)
+        self.assertEqual(locks['wait']['buckets']['+Inf'], 1)
+        self.assertListEqual(
+            [(item['key'], item['count']) for item in locks['contended_keys']],
+            [('1_1023301286656', 1)],
+        )
+        self.assertIn('receipt_number_cache', response.json())
+        self.assertIn('subject_id_cache', response.json())
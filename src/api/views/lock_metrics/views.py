@@ -0,0 +1,32 @@
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from las.services.lock_metrics import lock_metrics, optimistic_metrics
+from las.services.tools.receipt_number_cache import get_receipt_number_metadata_cache
+from las.services.tools.subject_id_cache import get_subject_id_cache
+
+
+class LockMetricsAPIView(APIView):
+    # Метрики блокировок, оптимистичной записи, кэшей номеров квитанций и идентификаторов субъектов
+    # процесса, обработавшего запрос
+    http_method_names = ['get']
+    renderer_classes = (JSONRenderer,)
+    authentication_classes = (JWTAuthentication, SessionAuthentication,)
+    permission_classes = (IsAdminUser,)
+    swagger_schema = None
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            data={
+                'locks': lock_metrics.snapshot(),
+                'optimistic': optimistic_metrics.snapshot(),
+                'receipt_number_cache': get_receipt_number_metadata_cache().get_stats(),
+                'subject_id_cache': get_subject_id_cache().get_stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
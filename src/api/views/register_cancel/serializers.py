@@ -1,11 +1,9 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from api.serializers import ReceiptNumberListSerializer
 from las.logger import LoggerMixin
-from las.services.tools.receipt_number import (
-    ReceiptNumberValidator,
-    ReceiptNumberEntity,
-)
+from las.services.tools.receipt_number import ReceiptNumberValidator
 
 
 class RegisterCancelInputReceiptNumbersSerializer(LoggerMixin, serializers.Serializer):
@@ -24,7 +22,7 @@ class RegisterCancelInputReceiptNumbersSerializer(LoggerMixin, serializers.Seria
     def validate(self, data):
         data = super().validate(data)
         ReceiptNumberValidator(
-            receipt_number_entity=ReceiptNumberEntity(receipt_number=data['receipt_number']),
+            receipt_number_entity=self.parent.get_receipt_number_entity(receipt_number=data['receipt_number']),
         ).valid(
             user=self.root.context['user'],
             raise_exception=True,
@@ -39,7 +37,7 @@ class RegisterCancelInputSerializer(serializers.Serializer):
     def create(self, validated_data):
         pass
 
-    payload = serializers.ListSerializer(
+    payload = ReceiptNumberListSerializer(
         help_text=_('Массив с данными (по числу видов обязательств, в которых должна снята с учёта заявка)'),
         child=RegisterCancelInputReceiptNumbersSerializer(),
         allow_empty=False,
@@ -2,11 +2,9 @@ from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
 from api.fields import AmountField
+from api.serializers import ReceiptNumberListSerializer
 from las.logger import LoggerMixin
-from las.services.tools.receipt_number import (
-    ReceiptNumberValidator,
-    ReceiptNumberEntity,
-)
+from las.services.tools.receipt_number import ReceiptNumberValidator
 
 
 class RegisterEditInputEditableLiabilitiesSerializer(LoggerMixin, serializers.Serializer):
@@ -28,7 +26,7 @@ class RegisterEditInputEditableLiabilitiesSerializer(LoggerMixin, serializers.Se
     def validate(self, data):
         data = super().validate(data)
         ReceiptNumberValidator(
-            receipt_number_entity=ReceiptNumberEntity(receipt_number=data['receipt_number']),
+            receipt_number_entity=self.parent.get_receipt_number_entity(receipt_number=data['receipt_number']),
         ).valid(
             user=self.root.context['user'],
             raise_exception=True,
@@ -43,7 +41,7 @@ class RegisterEditInputSerializer(serializers.Serializer):
     def create(self, validated_data):
         pass
 
-    payload = serializers.ListSerializer(
+    payload = ReceiptNumberListSerializer(
         help_text=_('Массив с данными (по числу видов обязательств, '
                     'в которых нужно изменить учитываемую сумму заявки)'),
         child=RegisterEditInputEditableLiabilitiesSerializer(),
@@ -11,6 +11,7 @@ from las.models import (
     Instance,
     LiabilitiesType,
     SubjectAccumulation,
+    SubjectBalance,
 )
 
 
@@ -115,3 +116,31 @@ class SubjectAccumulationAdmin(
     readonly_fields = [
         'ogrn',
     ]
+
+
+@admin.register(SubjectBalance)
+class SubjectBalanceAdmin(
+    ApproxCountPaginatorMixin,
+    DisablePreselectMixin,
+    DisableModifyMixin,
+    admin.ModelAdmin,
+):
+    list_display = [
+        'instance',
+        'liabilities_type',
+        'get_subject_ogrn',
+        'amount_total',
+        'last_register_id',
+    ]
+    search_fields = [
+        'subject__ogrn',
+    ]
+    list_filter = [
+        'instance__name',
+    ]
+
+    def get_subject_ogrn(self, obj):
+        return obj.subject.ogrn
+
+    get_subject_ogrn.short_description = 'ОГРН'
+    get_subject_ogrn.admin_order_field = 'subject__ogrn'
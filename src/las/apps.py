@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class LasConfig(AppConfig):
+    name = 'las'
+
+    def ready(self):
+        from las import signals  # noqa: F401
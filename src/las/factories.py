@@ -54,6 +54,7 @@ class AccumulationRegisterFactory(factory.django.DjangoModelFactory):
         model = AccumulationRegister
 
     user = factory.SubFactory(UserFactory)
+    instance = factory.SelfAttribute('user.instance')
     liabilities_type = factory.SubFactory(LiabilitiesTypeFactory)
     amount_record = factory.Faker('pyfloat', left_digits=4, right_digits=2, positive=True)
     amount_total = factory.Faker('pyfloat', left_digits=4, right_digits=2, positive=True)
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from las.services.tools.balance_checkpoint import BalanceCheckpointManager
+
+
+class Command(BaseCommand):
+    help = 'Инкрементально фиксирует контрольные точки остатков по записям регистра накопления'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LAS_BALANCE_CHECKPOINT_BATCH_SIZE,
+            help='Число записей регистра, обрабатываемых за один проход',
+        )
+        parser.add_argument(
+            '--lag',
+            type=int,
+            default=settings.LAS_BALANCE_CHECKPOINT_LAG,
+            help='Не обрабатывать записи моложе указанного числа секунд',
+        )
+
+    def handle(self, *args, **options):
+        checkpoint_manager = BalanceCheckpointManager(
+            batch_size=options['batch_size'],
+            lag=options['lag'],
+        )
+        total_created = 0
+        for start_id, end_id, created in checkpoint_manager.fill():
+            total_created += created
+            self.stdout.write(f'register ids ({start_id}, {end_id}]: {created} checkpoints')
+        self.stdout.write(self.style.SUCCESS(f'Done: {total_created} checkpoints'))
@@ -0,0 +1,76 @@
+import json
+import os
+from dataclasses import asdict
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from las.services.tools.reconciliation import ChainReconciler, IncrementalChainReconciler
+
+
+class Command(BaseCommand):
+    help = 'Сверяет цепочки amount_total регистра накопления и выводит расхождения (по одному JSON на строку)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Число параллельных процессов (полная сверка)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Число идентификаторов субъектов накопления в одном диапазоне (полная сверка)',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Сверять только записи после водяного знака и сохранять результаты в ReconciliationAudit',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.LAS_RECONCILIATION_BATCH_SIZE,
+            help='Число записей регистра, сверяемых за один проход (инкрементальная сверка)',
+        )
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            mismatches_count = self.handle_incremental(
+                batch_size=options['batch_size'],
+            )
+        else:
+            mismatches_count = self.handle_full(
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+            )
+
+        if mismatches_count:
+            raise CommandError(f'Found {mismatches_count} mismatches')
+        self.stderr.write('No mismatches found', style_func=self.style.SUCCESS)
+
+    def handle_full(self, workers: int, chunk_size: int) -> int:
+        mismatches_count = 0
+        for mismatch in ChainReconciler(
+                workers=workers,
+                chunk_size=chunk_size,
+        ).reconcile():
+            mismatches_count += 1
+            self.stdout.write(json.dumps(asdict(mismatch), default=str))
+        return mismatches_count
+
+    def handle_incremental(self, batch_size: int) -> int:
+        mismatches_count = 0
+        for audit in IncrementalChainReconciler(
+                batch_size=batch_size,
+        ).reconcile():
+            mismatches_count += audit.mismatches_count
+            self.stderr.write(
+                f'instance {audit.instance_id}, register ids ({audit.register_id_from}, {audit.register_id_to}]: '
+                f'{audit.rows_checked} rows, {audit.chains_checked} chains, {audit.mismatches_count} mismatches'
+            )
+            for mismatch in audit.mismatches:
+                self.stdout.write(json.dumps(mismatch, default=str))
+        return mismatches_count
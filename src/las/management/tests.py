@@ -0,0 +1,152 @@
+import json
+from decimal import Decimal
+from io import StringIO
+
+import mock
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from las.factories import LiabilitiesTypeFactory
+from las.models import BalanceCheckpoint, AccumulationRegister, ReconciliationAudit, ReconciliationWatermark
+from las.models.liabilities_type import TypeRunningChoices
+from las.services.tools.reconciliation import IncrementalChainReconciler
+from las.test_mixin import TestsMixin
+
+
+class CheckpointBalancesCommandTestCase(TestsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.liability_internal_accounting = LiabilitiesTypeFactory(
+            instance=cls.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+
+    def test_checkpoint_balances(self):
+        self.add_to_register(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('1000.00'), Decimal('2000.00')],
+        )
+        call_command('las_checkpoint_balances', lag=0, stdout=StringIO())
+        self.assertEqual(BalanceCheckpoint.objects.count(), 1)
+        checkpoint = BalanceCheckpoint.objects.get()
+        self.assertEqual(checkpoint.amount_total, Decimal('3000.00'))
+        self.assertEqual(checkpoint.last_register_id, AccumulationRegister.objects.last().id)
+
+        call_command('las_checkpoint_balances', lag=0, stdout=StringIO())
+        self.assertEqual(BalanceCheckpoint.objects.count(), 1)
+
+        self.add_to_register(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('500.00')],
+        )
+        call_command('las_checkpoint_balances', lag=0, batch_size=1, stdout=StringIO())
+        self.assertListEqual(
+            list(BalanceCheckpoint.objects.order_by('id').values_list('amount_total', flat=True)),
+            [Decimal('3000.00'), Decimal('3500.00')],
+        )
+
+
+class ReconcileCommandTestCase(TestsMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.liability_internal_accounting = LiabilitiesTypeFactory(
+            instance=cls.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        cls.add_to_register(
+            user=cls.user,
+            liabilities_type=cls.liability_internal_accounting,
+            subject_accumulation=cls.subject_accumulation,
+            amounts=[Decimal('1000.00'), Decimal('2000.00'), Decimal('3500.00')],
+        )
+
+    def test_reconcile(self):
+        stdout = StringIO()
+        call_command('las_reconcile', workers=1, stdout=stdout, stderr=StringIO())
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_reconcile_mismatch(self):
+        drifted_accumulation_register = AccumulationRegister.objects.order_by('id')[1]
+        AccumulationRegister.objects.filter(
+            id=drifted_accumulation_register.id,
+        ).update(
+            amount_total=Decimal('2500.00'),
+        )
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('las_reconcile', workers=1, stdout=stdout, stderr=StringIO())
+        mismatches = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertListEqual(
+            [mismatch['register_id'] for mismatch in mismatches],
+            [drifted_accumulation_register.id, AccumulationRegister.objects.order_by('id')[2].id],
+        )
+
+    def test_reconcile_archived(self):
+        # Записи до контрольной точки заархивированы: первая оставшаяся запись сверяется с контрольной точкой
+        call_command('las_checkpoint_balances', lag=0, stdout=StringIO())
+        self.add_to_register(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('500.00')],
+        )
+        AccumulationRegister.objects.filter(id__lte=BalanceCheckpoint.objects.get().last_register_id).delete()
+        stdout = StringIO()
+        call_command('las_reconcile', workers=1, stdout=stdout, stderr=StringIO())
+        self.assertEqual(stdout.getvalue(), '')
+
+    def test_reconcile_incremental(self):
+        call_command('las_reconcile', incremental=True, stdout=StringIO(), stderr=StringIO())
+        last_accumulation_register = AccumulationRegister.objects.last()
+        self.assertEqual(
+            ReconciliationWatermark.objects.get().last_register_id,
+            last_accumulation_register.id,
+        )
+        audit = ReconciliationAudit.objects.get()
+        self.assertEqual(audit.rows_checked, 3)
+        self.assertEqual(audit.chains_checked, 1)
+        self.assertEqual(audit.mismatches_count, 0)
+
+        self.add_to_register(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('500.00')],
+        )
+        drifted_accumulation_register = AccumulationRegister.objects.last()
+        AccumulationRegister.objects.filter(
+            id=drifted_accumulation_register.id,
+        ).update(
+            amount_total=Decimal('500.00'),
+        )
+        stdout = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('las_reconcile', incremental=True, stdout=stdout, stderr=StringIO())
+        audit = ReconciliationAudit.objects.last()
+        self.assertEqual(audit.register_id_from, last_accumulation_register.id)
+        self.assertEqual(audit.rows_checked, 1)
+        self.assertEqual(audit.mismatches_count, 1)
+        self.assertEqual(audit.mismatches[0]['register_id'], drifted_accumulation_register.id)
+        self.assertEqual(Decimal(audit.mismatches[0]['expected_amount_total']), Decimal('7000.00'))
+
+    def test_reconcile_incremental_fence(self):
+        # Транзакции снимка не завершены: граница сохраняется, записи не сверяются
+        with mock.patch.object(IncrementalChainReconciler, 'is_fence_passed', return_value=False):
+            call_command('las_reconcile', incremental=True, stdout=StringIO(), stderr=StringIO())
+        watermark = ReconciliationWatermark.objects.get()
+        self.assertEqual(watermark.last_register_id, 0)
+        self.assertEqual(watermark.fence_register_id, AccumulationRegister.objects.last().id)
+        self.assertIsNotNone(watermark.fence_snapshot)
+        self.assertFalse(ReconciliationAudit.objects.exists())
+
+        call_command('las_reconcile', incremental=True, stdout=StringIO(), stderr=StringIO())
+        watermark.refresh_from_db()
+        self.assertEqual(watermark.last_register_id, AccumulationRegister.objects.last().id)
+        self.assertIsNone(watermark.fence_snapshot)
+        self.assertEqual(ReconciliationAudit.objects.get().rows_checked, 3)
@@ -0,0 +1,119 @@
+# Generated by Django 3.2.8 on 2021-11-08 11:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def forward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION update_subject_balance() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            inst_id int8;
+        BEGIN
+            SELECT instance_id INTO inst_id from auth_user where id = NEW.user_id;
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id
+            )
+            VALUES (
+                NEW.created_at, NEW.changed_at, inst_id, NEW.subject_id, NEW.liabilities_type_id, NEW.amount_total, NEW.id
+            )
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at;
+            RETURN NULL;
+        END;
+        $$;
+    ''')
+
+
+def backward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('drop function update_subject_balance() cascade;')
+
+
+def forward_update_subject_balance_trigger(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE TRIGGER tr_ai_update_subject_balance
+        AFTER INSERT ON las_accumulationregister
+        FOR EACH ROW EXECUTE PROCEDURE update_subject_balance();
+    ''')
+
+
+def backward_update_subject_balance_trigger(apps, schema_editor):
+    schema_editor.execute('DROP TRIGGER IF EXISTS tr_ai_update_subject_balance ON las_accumulationregister;')
+
+
+def forward_fill_subject_balance(apps, schema_editor):
+    # Заполнение пачками по идентификатору записи регистра, каждая пачка в собственной транзакции
+    # (миграция не атомарна), чтобы не держать блокировки на всём регистре. Триггер создается до заполнения,
+    # поэтому записи, добавленные во время заполнения, уже учтены: остаток из пачки заменяет строку
+    # только если запись пачки новее последней учтенной записи
+    AccumulationRegister = apps.get_model('las', 'AccumulationRegister')
+    last_id = AccumulationRegister.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start_id in range(0, last_id, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(
+            '''
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id
+            )
+            SELECT DISTINCT ON (u.instance_id, r.subject_id, r.liabilities_type_id)
+                r.created_at, r.changed_at, u.instance_id, r.subject_id, r.liabilities_type_id, r.amount_total, r.id
+            FROM las_accumulationregister r
+            JOIN auth_user u ON u.id = r.user_id
+            WHERE u.instance_id IS NOT NULL
+              AND r.id > %s AND r.id <= %s
+            ORDER BY u.instance_id, r.subject_id, r.liabilities_type_id, r.id DESC
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at
+                WHERE EXCLUDED.last_register_id > las_subjectbalance.last_register_id;
+            ''',
+            params=[start_id, start_id + BACKFILL_BATCH_SIZE],
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('las', '0003_alter_subjectaccumulation_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubjectBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время создания')),
+                ('changed_at', models.DateTimeField(auto_now=True, verbose_name='Дата и время редактирования')),
+                ('amount_total', models.DecimalField(decimal_places=2, max_digits=17,
+                                                     verbose_name='Суммарное количество по субъекту обязательств в разрезе вида обязательств')),
+                ('last_register_id', models.BigIntegerField(blank=True, null=True,
+                                                            verbose_name='Идентификатор последней записи в регистре накопления')),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.instance',
+                                               verbose_name='Идентификатор инстанции')),
+                ('liabilities_type',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.liabilitiestype',
+                                   verbose_name='Идентификатор вида обязательств')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.subjectaccumulation',
+                                              verbose_name='Идентификатор субъекта накопления')),
+            ],
+            options={
+                'verbose_name': 'Остаток субъекта накопления',
+                'verbose_name_plural': 'Остатки субъектов накопления',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='subjectbalance',
+            constraint=models.UniqueConstraint(fields=('instance', 'subject', 'liabilities_type'),
+                                               name='unique_subject_balance'),
+        ),
+        migrations.RunPython(forward_update_subject_balance_function, backward_update_subject_balance_function),
+        migrations.RunPython(forward_update_subject_balance_trigger, backward_update_subject_balance_trigger),
+        migrations.RunPython(forward_fill_subject_balance, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 3.2.8 on 2021-11-15 10:02
+
+import django.db.models.deletion
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def forward_generate_receipt_number_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.instance_id IS NULL
+            THEN
+                NEW.instance_id := (SELECT instance_id from auth_user where id = NEW.user_id);
+            END IF;
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(NEW.instance_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+def backward_generate_receipt_number_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            inst_id        int8;
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                SELECT instance_id INTO inst_id from auth_user where id = NEW.user_id;
+                seq := 'receipt_number_seq_' || inst_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(inst_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+def forward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION update_subject_balance() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id
+            )
+            VALUES (
+                NEW.created_at, NEW.changed_at, NEW.instance_id, NEW.subject_id, NEW.liabilities_type_id, NEW.amount_total, NEW.id
+            )
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at;
+            RETURN NULL;
+        END;
+        $$;
+    ''')
+
+
+def backward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION update_subject_balance() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            inst_id int8;
+        BEGIN
+            SELECT instance_id INTO inst_id from auth_user where id = NEW.user_id;
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id
+            )
+            VALUES (
+                NEW.created_at, NEW.changed_at, inst_id, NEW.subject_id, NEW.liabilities_type_id, NEW.amount_total, NEW.id
+            )
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at;
+            RETURN NULL;
+        END;
+        $$;
+    ''')
+
+
+def forward_fill_instance(apps, schema_editor):
+    # Заполнение пачками, каждая пачка в собственной транзакции (миграция не атомарна),
+    # чтобы не держать блокировки на всём регистре
+    AccumulationRegister = apps.get_model('las', 'AccumulationRegister')
+    last_id = AccumulationRegister.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start_id in range(0, last_id, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(
+            '''
+            UPDATE las_accumulationregister r
+            SET instance_id = u.instance_id
+            FROM auth_user u
+            WHERE u.id = r.user_id
+              AND r.id > %s AND r.id <= %s
+              AND r.instance_id IS NULL;
+            ''',
+            params=[start_id, start_id + BACKFILL_BATCH_SIZE],
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('las', '0004_subjectbalance'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql='''
+                        ALTER TABLE las_accumulationregister ADD COLUMN instance_id bigint NULL;
+                        ALTER TABLE las_accumulationregister
+                            ADD CONSTRAINT las_accumulationregister_instance_id_fk_las_instance_id
+                            FOREIGN KEY (instance_id) REFERENCES las_instance (id)
+                            DEFERRABLE INITIALLY DEFERRED NOT VALID;
+                    ''',
+                    reverse_sql='ALTER TABLE las_accumulationregister DROP COLUMN instance_id;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='accumulationregister',
+                    name='instance',
+                    field=models.ForeignKey(blank=True, db_index=False, null=True,
+                                            on_delete=django.db.models.deletion.CASCADE, to='las.instance',
+                                            verbose_name='Идентификатор инстанции'),
+                ),
+            ],
+        ),
+        migrations.RunPython(forward_generate_receipt_number_function, backward_generate_receipt_number_function),
+        migrations.RunPython(forward_update_subject_balance_function, backward_update_subject_balance_function),
+        migrations.RunPython(forward_fill_instance, migrations.RunPython.noop),
+        migrations.RunSQL(
+            sql='''
+                ALTER TABLE las_accumulationregister
+                    VALIDATE CONSTRAINT las_accumulationregister_instance_id_fk_las_instance_id;
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='accumulationregister',
+            index=models.Index(fields=['instance', 'subject', 'liabilities_type', '-id'], include=('amount_total',),
+                               name='las_accreg_chain_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.8 on 2021-11-22 14:37
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('las', '0005_accumulationregister_instance'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='accumulationregister',
+            index=models.Index(fields=['subject', 'liabilities_type', 'created_at'], name='las_accreg_as_of_idx'),
+        ),
+    ]
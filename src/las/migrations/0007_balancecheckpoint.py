@@ -0,0 +1,48 @@
+# Generated by Django 3.2.8 on 2021-11-29 09:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0006_accumulationregister_as_of_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время создания')),
+                ('changed_at', models.DateTimeField(auto_now=True, verbose_name='Дата и время редактирования')),
+                ('last_register_id', models.BigIntegerField(db_index=True,
+                                                            verbose_name='Идентификатор последней учтённой записи в регистре накопления')),
+                ('register_created_at', models.DateTimeField(
+                    verbose_name='Дата и время создания последней учтённой записи в регистре накопления')),
+                ('amount_total', models.DecimalField(decimal_places=2, max_digits=17,
+                                                     verbose_name='Суммарное количество по субъекту обязательств в разрезе вида обязательств')),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.instance',
+                                               verbose_name='Идентификатор инстанции')),
+                ('liabilities_type',
+                 models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.liabilitiestype',
+                                   verbose_name='Идентификатор вида обязательств')),
+                ('subject', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.subjectaccumulation',
+                                              verbose_name='Идентификатор субъекта накопления')),
+            ],
+            options={
+                'verbose_name': 'Контрольная точка остатка',
+                'verbose_name_plural': 'Контрольные точки остатков',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='balancecheckpoint',
+            index=models.Index(fields=['subject', 'liabilities_type', 'register_created_at'],
+                               name='las_balcp_as_of_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='balancecheckpoint',
+            constraint=models.UniqueConstraint(fields=('instance', 'subject', 'liabilities_type', 'last_register_id'),
+                                               name='unique_balance_checkpoint'),
+        ),
+    ]
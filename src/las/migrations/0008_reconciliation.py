@@ -0,0 +1,53 @@
+# Generated by Django 3.2.8 on 2021-12-06 16:12
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0007_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время создания')),
+                ('changed_at', models.DateTimeField(auto_now=True, verbose_name='Дата и время редактирования')),
+                ('last_register_id', models.BigIntegerField(default=0,
+                                                            verbose_name='Идентификатор последней сверенной записи в регистре накопления')),
+                ('instance', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='las.instance',
+                                                  verbose_name='Идентификатор инстанции')),
+            ],
+            options={
+                'verbose_name': 'Водяной знак сверки',
+                'verbose_name_plural': 'Водяные знаки сверки',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReconciliationAudit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата и время создания')),
+                ('changed_at', models.DateTimeField(auto_now=True, verbose_name='Дата и время редактирования')),
+                ('register_id_from', models.BigIntegerField(
+                    verbose_name='Идентификатор записи регистра накопления (не включительно), с которой начата сверка')),
+                ('register_id_to', models.BigIntegerField(
+                    verbose_name='Идентификатор записи регистра накопления (включительно), которой закончена сверка')),
+                ('chains_checked', models.PositiveIntegerField(verbose_name='Число проверенных цепочек остатков')),
+                ('rows_checked', models.PositiveIntegerField(verbose_name='Число проверенных записей регистра накопления')),
+                ('mismatches_count', models.PositiveIntegerField(verbose_name='Число расхождений')),
+                ('mismatches', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder,
+                                                verbose_name='Расхождения')),
+                ('instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='las.instance',
+                                               verbose_name='Идентификатор инстанции')),
+            ],
+            options={
+                'verbose_name': 'Результат сверки',
+                'verbose_name_plural': 'Результаты сверки',
+            },
+        ),
+    ]
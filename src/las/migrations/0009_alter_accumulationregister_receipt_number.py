@@ -0,0 +1,20 @@
+# Generated by Django 3.2.8 on 2021-12-13 09:41
+
+from django.db import migrations
+
+import las.models.fields
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0008_reconciliation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='accumulationregister',
+            name='receipt_number',
+            field=las.models.fields.TriggerAssignedCharField(db_index=True, max_length=100,
+                                                             verbose_name='Номер квитанции'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 3.2.8 on 2021-12-20 12:17
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+import las.models.fields
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def forward_generate_receipt_number_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.instance_id IS NULL
+            THEN
+                NEW.instance_id := (SELECT instance_id from auth_user where id = NEW.user_id);
+            END IF;
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(NEW.instance_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+                NEW.receipt_serial := sv;
+            ELSIF NEW.receipt_serial IS NULL AND split_part(NEW.receipt_number, '-', 3) ~ '^[0-9]{1,18}$'
+            THEN
+                NEW.receipt_serial := split_part(NEW.receipt_number, '-', 3)::int8;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+def backward_generate_receipt_number_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.instance_id IS NULL
+            THEN
+                NEW.instance_id := (SELECT instance_id from auth_user where id = NEW.user_id);
+            END IF;
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(NEW.instance_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+def forward_fill_receipt_serial(apps, schema_editor):
+    # Заполнение пачками, каждая пачка в собственной транзакции (миграция не атомарна)
+    AccumulationRegister = apps.get_model('las', 'AccumulationRegister')
+    last_id = AccumulationRegister.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    for start_id in range(0, last_id, BACKFILL_BATCH_SIZE):
+        schema_editor.execute(
+            '''
+            UPDATE las_accumulationregister
+            SET receipt_serial = split_part(receipt_number, '-', 3)::int8
+            WHERE id > %s AND id <= %s
+              AND receipt_serial IS NULL
+              AND split_part(receipt_number, '-', 3) ~ '^[0-9]{1,18}$';
+            ''',
+            params=[start_id, start_id + BACKFILL_BATCH_SIZE],
+        )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('las', '0009_alter_accumulationregister_receipt_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accumulationregister',
+            name='receipt_serial',
+            field=las.models.fields.TriggerAssignedBigIntegerField(
+                blank=True, null=True,
+                verbose_name='Порядковый номер квитанции в разрезе инстанции и вида обязательств'),
+        ),
+        migrations.RunPython(forward_generate_receipt_number_function, backward_generate_receipt_number_function),
+        migrations.RunPython(forward_fill_receipt_serial, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='accumulationregister',
+            index=models.Index(fields=['instance', 'liabilities_type', 'receipt_serial'],
+                               name='las_accreg_receipt_idx'),
+        ),
+    ]
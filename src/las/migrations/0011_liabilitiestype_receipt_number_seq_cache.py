@@ -0,0 +1,93 @@
+# Generated by Django 3.2.8 on 2021-12-27 10:36
+
+from django.db import migrations, models
+
+
+def forward_create_receipt_number_seq_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION create_receipt_number_seq() RETURNS TRIGGER AS
+        $$
+        DECLARE
+            seq     text;
+            cache   int8;
+        BEGIN
+            seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.id;
+            cache := GREATEST(NEW.receipt_number_seq_cache, 1);
+            EXECUTE format('CREATE SEQUENCE IF NOT EXISTS %I CACHE %s OWNED BY las_liabilitiestype.id', seq, cache);
+            IF TG_OP = 'UPDATE'
+            THEN
+                EXECUTE format('ALTER SEQUENCE %I CACHE %s', seq, cache);
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE 'plpgsql';
+    ''')
+
+
+def backward_create_receipt_number_seq_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION create_receipt_number_seq() RETURNS TRIGGER AS
+        $$
+        DECLARE
+            seq     text;
+        BEGIN
+            seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.id;
+            IF NOT EXISTS(SELECT 0 FROM pg_class where relname = seq)
+            THEN
+                EXECUTE 'CREATE SEQUENCE ' || seq || ' OWNED BY las_liabilitiestype.id';
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE 'plpgsql';
+    ''')
+
+
+def forward_create_receipt_number_seq_triggers(apps, schema_editor):
+    # Sequence создается при добавлении вида обязательств, при изменении - только если изменились
+    # инстанция или размер кэша sequence
+    schema_editor.execute('''
+        DROP TRIGGER IF EXISTS tr_ai_create_receipt_number_seq ON las_liabilitiestype;
+
+        CREATE TRIGGER tr_ai_create_receipt_number_seq
+        AFTER INSERT ON las_liabilitiestype
+        FOR EACH ROW EXECUTE PROCEDURE create_receipt_number_seq();
+
+        CREATE TRIGGER tr_au_alter_receipt_number_seq
+        AFTER UPDATE OF instance_id, receipt_number_seq_cache ON las_liabilitiestype
+        FOR EACH ROW
+        WHEN (OLD.instance_id IS DISTINCT FROM NEW.instance_id
+              OR OLD.receipt_number_seq_cache IS DISTINCT FROM NEW.receipt_number_seq_cache)
+        EXECUTE PROCEDURE create_receipt_number_seq();
+    ''')
+
+
+def backward_create_receipt_number_seq_triggers(apps, schema_editor):
+    schema_editor.execute('''
+        DROP TRIGGER IF EXISTS tr_au_alter_receipt_number_seq ON las_liabilitiestype;
+        DROP TRIGGER IF EXISTS tr_ai_create_receipt_number_seq ON las_liabilitiestype;
+
+        CREATE TRIGGER tr_ai_create_receipt_number_seq
+        AFTER INSERT OR UPDATE ON las_liabilitiestype
+        FOR EACH ROW EXECUTE PROCEDURE create_receipt_number_seq();
+    ''')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0010_accumulationregister_receipt_serial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='liabilitiestype',
+            name='receipt_number_seq_cache',
+            field=models.PositiveIntegerField(
+                default=1,
+                help_text='Количество значений, резервируемых соединением базы данных за одно обращение к sequence. '
+                          'Значение больше 1 ускоряет выдачу номеров квитанций, но номера из разных соединений '
+                          'перестают выдаваться строго по возрастанию, а при перезапуске базы возможны пропуски',
+                verbose_name='Размер кэша sequence номеров квитанций'),
+        ),
+        migrations.RunPython(forward_create_receipt_number_seq_function, backward_create_receipt_number_seq_function),
+        migrations.RunPython(forward_create_receipt_number_seq_triggers, backward_create_receipt_number_seq_triggers),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2.8 on 2022-01-17 14:52
+
+from django.db import migrations, models
+
+
+def forward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION update_subject_balance() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id,
+                version
+            )
+            VALUES (
+                NEW.created_at, NEW.changed_at, NEW.instance_id, NEW.subject_id, NEW.liabilities_type_id, NEW.amount_total, NEW.id,
+                1
+            )
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at,
+                    version = las_subjectbalance.version + 1;
+            RETURN NULL;
+        END;
+        $$;
+    ''')
+
+
+def backward_update_subject_balance_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION update_subject_balance() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id
+            )
+            VALUES (
+                NEW.created_at, NEW.changed_at, NEW.instance_id, NEW.subject_id, NEW.liabilities_type_id, NEW.amount_total, NEW.id
+            )
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = EXCLUDED.amount_total,
+                    last_register_id = EXCLUDED.last_register_id,
+                    changed_at = EXCLUDED.changed_at;
+            RETURN NULL;
+        END;
+        $$;
+    ''')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0011_liabilitiestype_receipt_number_seq_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subjectbalance',
+            name='version',
+            field=models.BigIntegerField(default=0,
+                                         verbose_name='Версия остатка (увеличивается при каждой записи в регистр накопления)'),
+        ),
+        migrations.RunPython(forward_update_subject_balance_function, backward_update_subject_balance_function),
+    ]
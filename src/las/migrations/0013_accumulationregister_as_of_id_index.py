@@ -0,0 +1,24 @@
+# Generated by Django 3.2.8 on 2022-01-24 11:08
+
+from django.contrib.postgres.operations import AddIndexConcurrently, RemoveIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('las', '0012_subjectbalance_version'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='accumulationregister',
+            index=models.Index(fields=['subject', 'liabilities_type', 'created_at', 'id'],
+                               name='las_accreg_as_of_id_idx'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='accumulationregister',
+            name='las_accreg_as_of_idx',
+        ),
+    ]
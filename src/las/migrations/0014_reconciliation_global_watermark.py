@@ -0,0 +1,57 @@
+# Generated by Django 3.2.8 on 2022-01-26 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def forward_collapse_watermarks(apps, schema_editor):
+    # Сверка идет одним проходом по всем инстанциям: продолжаем с наименьшего водяного знака,
+    # повторно сверенные записи других инстанций дают лишь повторные результаты сверки
+    ReconciliationWatermark = apps.get_model('las', 'ReconciliationWatermark')
+    watermark = ReconciliationWatermark.objects.order_by('last_register_id', 'id').first()
+    if watermark is not None:
+        ReconciliationWatermark.objects.exclude(id=watermark.id).delete()
+
+
+def backward_delete_watermarks(apps, schema_editor):
+    ReconciliationWatermark = apps.get_model('las', 'ReconciliationWatermark')
+    ReconciliationWatermark.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0013_accumulationregister_as_of_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            forward_collapse_watermarks,
+            migrations.RunPython.noop,
+        ),
+        migrations.RemoveField(
+            model_name='reconciliationwatermark',
+            name='instance',
+        ),
+        migrations.RunPython(
+            migrations.RunPython.noop,
+            backward_delete_watermarks,
+        ),
+        migrations.AddField(
+            model_name='reconciliationwatermark',
+            name='fence_register_id',
+            field=models.BigIntegerField(blank=True, null=True,
+                                         verbose_name='Идентификатор последней записи в регистре накопления, видимой в снимке транзакций'),
+        ),
+        migrations.AddField(
+            model_name='reconciliationwatermark',
+            name='fence_snapshot',
+            field=models.TextField(blank=True, null=True,
+                                   verbose_name='Снимок транзакций, после завершения которых сверяются записи до fence_register_id'),
+        ),
+        migrations.AlterField(
+            model_name='reconciliationaudit',
+            name='instance',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                    to='las.instance', verbose_name='Идентификатор инстанции'),
+        ),
+    ]
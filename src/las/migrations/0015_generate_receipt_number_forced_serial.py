@@ -0,0 +1,85 @@
+# Generated by Django 3.2.8 on 2022-01-31 10:12
+
+from django.db import migrations
+
+
+def forward_generate_receipt_number_function(apps, schema_editor):
+    # Номер квитанции, переданный вместе с порядковым номером (ReceiptNumberAllocator, корректировка),
+    # не разбирается: проверка регулярного выражения вынесена во вложенный IF, потому что порядок вычисления
+    # условий AND в выражении не гарантирован
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.instance_id IS NULL
+            THEN
+                NEW.instance_id := (SELECT instance_id from auth_user where id = NEW.user_id);
+            END IF;
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(NEW.instance_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+                NEW.receipt_serial := sv;
+            ELSIF NEW.receipt_serial IS NULL
+            THEN
+                IF split_part(NEW.receipt_number, '-', 3) ~ '^[0-9]{1,18}$'
+                THEN
+                    NEW.receipt_serial := split_part(NEW.receipt_number, '-', 3)::int8;
+                END IF;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+def backward_generate_receipt_number_function(apps, schema_editor):
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION generate_receipt_number() RETURNS TRIGGER
+            LANGUAGE plpgsql
+        AS $$
+        DECLARE
+            seq            text;
+            sv             int8;
+            receipt_number text;
+        BEGIN
+            IF NEW.instance_id IS NULL
+            THEN
+                NEW.instance_id := (SELECT instance_id from auth_user where id = NEW.user_id);
+            END IF;
+            IF NEW.receipt_number IS NULL OR NEW.receipt_number = ''
+            THEN
+                seq := 'receipt_number_seq_' || NEW.instance_id || '_' || NEW.liabilities_type_id;
+                sv := NEXTVAL(seq);
+
+                receipt_number := lpad(NEW.instance_id::text, 4, '0') || '-' || lpad(NEW.liabilities_type_id::text, 4, '0') || '-' ||
+                                  lpad(sv::text, GREATEST(length(sv::text), 5), '0');
+                NEW.receipt_number := receipt_number;
+                NEW.receipt_serial := sv;
+            ELSIF NEW.receipt_serial IS NULL AND split_part(NEW.receipt_number, '-', 3) ~ '^[0-9]{1,18}$'
+            THEN
+                NEW.receipt_serial := split_part(NEW.receipt_number, '-', 3)::int8;
+            END IF;
+            RETURN NEW;
+        END;
+        $$;
+    ''')
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('las', '0014_reconciliation_global_watermark'),
+    ]
+
+    operations = [
+        migrations.RunPython(forward_generate_receipt_number_function, backward_generate_receipt_number_function),
+    ]
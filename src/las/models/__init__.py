@@ -1,7 +1,10 @@
+from .balance_checkpoint import BalanceCheckpoint
 from .accumulation_register import AccumulationRegister
 from .action_type import ActionType
 from .external_action_process import ExternalActionProcess
 from .instance import Instance
 from .liabilities_type import LiabilitiesType
+from .reconciliation import ReconciliationAudit, ReconciliationWatermark
 from .subject_accumulation import SubjectAccumulation
+from .subject_balance import SubjectBalance
 from .user import User
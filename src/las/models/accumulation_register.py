@@ -2,6 +2,8 @@ from dj_model_utils.abstract_models.datetime_tracking import DatetimeTrackingMod
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
+from .fields import TriggerAssignedBigIntegerField, TriggerAssignedCharField
+
 
 class AccumulationRegister(DatetimeTrackingModel):
     user = models.ForeignKey(
@@ -9,16 +11,29 @@ class AccumulationRegister(DatetimeTrackingModel):
         on_delete=models.CASCADE,
         verbose_name=_('Система-клиент, поставившая на учет'),
     )
+    instance = models.ForeignKey(
+        'las.Instance',
+        null=True,
+        blank=True,
+        db_index=False,
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор инстанции'),
+    )
     liabilities_type = models.ForeignKey(
         'las.LiabilitiesType',
         on_delete=models.CASCADE,
         verbose_name=_('Идентификатор вида обязательств'),
     )
-    receipt_number = models.CharField(
+    receipt_number = TriggerAssignedCharField(
         db_index=True,
         max_length=100,
         verbose_name=_('Номер квитанции'),
     )
+    receipt_serial = TriggerAssignedBigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_('Порядковый номер квитанции в разрезе инстанции и вида обязательств'),
+    )
     amount_record = models.DecimalField(
         max_digits=17,
         decimal_places=2,
@@ -41,3 +56,22 @@ class AccumulationRegister(DatetimeTrackingModel):
     class Meta:
         verbose_name = _('Накопление в регистре накопления')
         verbose_name_plural = _('Накопления в регистре накопления')
+        indexes = [
+            # Цепочка остатков (инстанция, субъект, вид обязательств): последняя запись читается index-only
+            models.Index(
+                fields=['instance', 'subject', 'liabilities_type', '-id'],
+                include=['amount_total'],
+                name='las_accreg_chain_idx',
+            ),
+            # Остаток на момент времени: одна проба индекса на вид обязательств; записи с одинаковым временем
+            # создания (пакетная вставка) упорядочиваются по id, как и цепочка остатков
+            models.Index(
+                fields=['subject', 'liabilities_type', 'created_at', 'id'],
+                name='las_accreg_as_of_id_idx',
+            ),
+            # Поиск по номеру квитанции: разобранный номер (инстанция, вид обязательств, порядковый номер)
+            models.Index(
+                fields=['instance', 'liabilities_type', 'receipt_serial'],
+                name='las_accreg_receipt_idx',
+            ),
+        ]
@@ -0,0 +1,54 @@
+from dj_model_utils.abstract_models.datetime_tracking import DatetimeTrackingModel
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class BalanceCheckpoint(DatetimeTrackingModel):
+    # Зафиксированный остаток цепочки (инстанция, субъект, вид обязательств) на записи регистра last_register_id.
+    # Ссылка на запись регистра не является внешним ключом, чтобы записи до контрольной точки можно было архивировать
+    instance = models.ForeignKey(
+        'las.Instance',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор инстанции'),
+    )
+    subject = models.ForeignKey(
+        'las.SubjectAccumulation',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор субъекта накопления'),
+    )
+    liabilities_type = models.ForeignKey(
+        'las.LiabilitiesType',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор вида обязательств'),
+    )
+    last_register_id = models.BigIntegerField(
+        db_index=True,
+        verbose_name=_('Идентификатор последней учтённой записи в регистре накопления'),
+    )
+    register_created_at = models.DateTimeField(
+        verbose_name=_('Дата и время создания последней учтённой записи в регистре накопления'),
+    )
+    amount_total = models.DecimalField(
+        max_digits=17,
+        decimal_places=2,
+        verbose_name=_('Суммарное количество по субъекту обязательств в разрезе вида обязательств'),
+    )
+
+    def __str__(self):
+        return f'{self.subject_id}/{self.liabilities_type_id}@{self.last_register_id}: {self.amount_total} ({self.id})'
+
+    class Meta:
+        verbose_name = _('Контрольная точка остатка')
+        verbose_name_plural = _('Контрольные точки остатков')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['instance', 'subject', 'liabilities_type', 'last_register_id'],
+                name='unique_balance_checkpoint',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['subject', 'liabilities_type', 'register_created_at'],
+                name='las_balcp_as_of_idx',
+            ),
+        ]
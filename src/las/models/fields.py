@@ -0,0 +1,11 @@
+from django.db import models
+
+
+class TriggerAssignedCharField(models.CharField):
+    # Значение поля заполняется триггером базы данных и возвращается из INSERT ... RETURNING,
+    # поэтому после создания записи не требуется повторное чтение из базы
+    db_returning = True
+
+
+class TriggerAssignedBigIntegerField(models.BigIntegerField):
+    db_returning = True
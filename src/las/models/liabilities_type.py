@@ -37,6 +37,13 @@ class LiabilitiesType(DatetimeTrackingModel):
         verbose_name=_('Тип ведения учёта'),
         choices=TypeRunningChoices.choices(),
     )
+    receipt_number_seq_cache = models.PositiveIntegerField(
+        default=1,
+        verbose_name=_('Размер кэша sequence номеров квитанций'),
+        help_text=_('Количество значений, резервируемых соединением базы данных за одно обращение к sequence. '
+                    'Значение больше 1 ускоряет выдачу номеров квитанций, но номера из разных соединений '
+                    'перестают выдаваться строго по возрастанию, а при перезапуске базы возможны пропуски'),
+    )
 
     def __str__(self):
         return f'{self.name} ({self.id})'
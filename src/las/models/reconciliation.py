@@ -0,0 +1,66 @@
+from dj_model_utils.abstract_models.datetime_tracking import DatetimeTrackingModel
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class ReconciliationWatermark(DatetimeTrackingModel):
+    # Общий для всех инстанций водяной знак инкрементальной сверки (одна запись)
+    last_register_id = models.BigIntegerField(
+        default=0,
+        verbose_name=_('Идентификатор последней сверенной записи в регистре накопления'),
+    )
+    fence_register_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_('Идентификатор последней записи в регистре накопления, видимой в снимке транзакций'),
+    )
+    fence_snapshot = models.TextField(
+        null=True,
+        blank=True,
+        verbose_name=_('Снимок транзакций, после завершения которых сверяются записи до fence_register_id'),
+    )
+
+    def __str__(self):
+        return f'{self.last_register_id} ({self.id})'
+
+    class Meta:
+        verbose_name = _('Водяной знак сверки')
+        verbose_name_plural = _('Водяные знаки сверки')
+
+
+class ReconciliationAudit(DatetimeTrackingModel):
+    instance = models.ForeignKey(
+        'las.Instance',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор инстанции'),
+    )
+    register_id_from = models.BigIntegerField(
+        verbose_name=_('Идентификатор записи регистра накопления (не включительно), с которой начата сверка'),
+    )
+    register_id_to = models.BigIntegerField(
+        verbose_name=_('Идентификатор записи регистра накопления (включительно), которой закончена сверка'),
+    )
+    chains_checked = models.PositiveIntegerField(
+        verbose_name=_('Число проверенных цепочек остатков'),
+    )
+    rows_checked = models.PositiveIntegerField(
+        verbose_name=_('Число проверенных записей регистра накопления'),
+    )
+    mismatches_count = models.PositiveIntegerField(
+        verbose_name=_('Число расхождений'),
+    )
+    mismatches = models.JSONField(
+        default=list,
+        encoder=DjangoJSONEncoder,
+        verbose_name=_('Расхождения'),
+    )
+
+    def __str__(self):
+        return f'{self.instance_id}: ({self.register_id_from}, {self.register_id_to}] ({self.id})'
+
+    class Meta:
+        verbose_name = _('Результат сверки')
+        verbose_name_plural = _('Результаты сверки')
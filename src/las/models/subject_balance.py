@@ -0,0 +1,50 @@
+from dj_model_utils.abstract_models.datetime_tracking import DatetimeTrackingModel
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class SubjectBalance(DatetimeTrackingModel):
+    # Строки поддерживаются триггером tr_ai_update_subject_balance в той же транзакции,
+    # что и вставка в регистр накопления
+    instance = models.ForeignKey(
+        'las.Instance',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор инстанции'),
+    )
+    subject = models.ForeignKey(
+        'las.SubjectAccumulation',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор субъекта накопления'),
+    )
+    liabilities_type = models.ForeignKey(
+        'las.LiabilitiesType',
+        on_delete=models.CASCADE,
+        verbose_name=_('Идентификатор вида обязательств'),
+    )
+    amount_total = models.DecimalField(
+        max_digits=17,
+        decimal_places=2,
+        verbose_name=_('Суммарное количество по субъекту обязательств в разрезе вида обязательств'),
+    )
+    last_register_id = models.BigIntegerField(
+        null=True,
+        blank=True,
+        verbose_name=_('Идентификатор последней записи в регистре накопления'),
+    )
+    version = models.BigIntegerField(
+        default=0,
+        verbose_name=_('Версия остатка (увеличивается при каждой записи в регистр накопления)'),
+    )
+
+    def __str__(self):
+        return f'{self.subject_id}/{self.liabilities_type_id}: {self.amount_total} ({self.id})'
+
+    class Meta:
+        verbose_name = _('Остаток субъекта накопления')
+        verbose_name_plural = _('Остатки субъектов накопления')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['instance', 'subject', 'liabilities_type'],
+                name='unique_subject_balance',
+            ),
+        ]
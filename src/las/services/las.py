@@ -1,38 +1,30 @@
 import logging
 from copy import deepcopy
+from datetime import datetime
 from itertools import groupby
-from typing import List
+from typing import Callable, Iterable, List, Tuple
 
-from django_redis import get_redis_connection
-from redis_lock import Lock
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, transaction
 
 from las.logger import LoggerMixin
-from .register_add.handlers import RegisterAdd
+from .lock_metrics import optimistic_metrics
+from .locks import get_lock, hold_locks
+from .register_add.handlers import OptimisticConflict, RegisterAdd, RegisterAddAtomic, RegisterAddOptimistic
 from .register_cancel.handlers import RegisterCancel
 from .register_edit.handlers import RegisterEdit
-from .tools.receipt_number import ReceiptNumberEntity
+from .tools.balance import BalanceReader
+from .tools.receipt_number import ReceiptNumberResolver
 from .tools.subject_accumulation import SubjectAccumulationEntity
 from ..models import User
 
+WRITE_MODE_LOCK = 'lock'
+WRITE_MODE_OPTIMISTIC = 'optimistic'
+WRITE_MODE_ATOMIC = 'atomic'
 
-def get_lock(
-        instance_id: int,
-        subject_id: int | str,
-        expire: int = 10,
-        auto_renewal: bool = True,
-) -> Lock:
-    lock_conn = get_redis_connection('registration_accounting_events')
-    lock_key = '{instance_id}_{subject_id}'.format(
-        instance_id=instance_id,
-        subject_id=subject_id,
-    )
-
-    return Lock(
-        redis_client=lock_conn,
-        name=lock_key,
-        expire=expire,
-        auto_renewal=auto_renewal,
-    )
+# Код ошибки PostgreSQL deadlock_detected
+DEADLOCK_DETECTED_PGCODE = '40P01'
 
 
 class LiabilityAccountingSystem(LoggerMixin):
@@ -44,13 +36,98 @@ class LiabilityAccountingSystem(LoggerMixin):
     @staticmethod
     def get_groupby_payload(payload: List[dict]):
         payload = deepcopy(payload)
+        receipt_number_resolver = ReceiptNumberResolver(
+            receipt_numbers=[item['receipt_number'] for item in payload],
+        )
         for item in payload:
-            item['receipt_number'] = ReceiptNumberEntity(receipt_number=item['receipt_number'])
+            item['receipt_number'] = receipt_number_resolver.get_entity(receipt_number=item['receipt_number'])
 
         sorted_payload = sorted(payload, key=lambda x: x['receipt_number'].subject_accumulation.id)
         return groupby(sorted_payload, lambda x: x['receipt_number'].subject_accumulation_entity)
 
-    def add(self, subject_accumulation: SubjectAccumulationEntity, payload: List[dict]) -> List[dict]:
+    @staticmethod
+    def get_liabilities_type_ids(payload: List[dict]) -> List[int]:
+        return [item['receipt_number'].liability_type_id for item in payload]
+
+    def process_subject_groups(
+            self,
+            subject_groups: Iterable[Tuple[SubjectAccumulationEntity, Iterable[dict]]],
+            handler: Callable[[List[dict]], List[dict]],
+            single_transaction: bool,
+    ) -> List[dict]:
+        # Блокировки субъектов берутся в порядке external_id, поэтому параллельные запросы
+        # с пересекающимися наборами субъектов не блокируют друг друга взаимно
+        subject_groups = sorted(
+            [(subject_accumulation, list(group_payload)) for subject_accumulation, group_payload in subject_groups],
+            key=lambda x: x[0].external_id,
+        )
+        results = []
+        if single_transaction:
+            with hold_locks(*[
+                get_lock(
+                    instance_id=self.user.instance.id,
+                    subject_id=subject_accumulation.external_id,
+                    liabilities_type_ids=self.get_liabilities_type_ids(group_payload),
+                )
+                for subject_accumulation, group_payload in subject_groups
+            ]):
+                with transaction.atomic():
+                    for _, group_payload in subject_groups:
+                        results.extend(handler(group_payload))
+        else:
+            for subject_accumulation, group_payload in subject_groups:
+                with hold_locks(get_lock(
+                        instance_id=self.user.instance.id,
+                        subject_id=subject_accumulation.external_id,
+                        liabilities_type_ids=self.get_liabilities_type_ids(group_payload),
+                )):
+                    results.extend(handler(group_payload))
+        return results
+
+    @staticmethod
+    def check_write_mode(write_mode: str) -> None:
+        # Снятие с учета и корректировка вычисляют остаток в приложении под блокировкой субъекта, а триггер
+        # update_subject_balance записывает этот остаток в строку остатка. Постановка на учет без блокировки
+        # упорядочивается с ними только блокировкой тех же строк остатков, то есть блокировкой `row`:
+        # с блокировками `redis` и `advisory` приращение параллельной постановки на учет будет потеряно
+        if write_mode != WRITE_MODE_LOCK and settings.LAS_LOCK_BACKEND != 'row':
+            raise ImproperlyConfigured(
+                f'LAS write mode `{write_mode}` requires LAS_LOCK_BACKEND = `row`, '
+                f'got `{settings.LAS_LOCK_BACKEND}`.',
+            )
+
+    def add_optimistic(self, subject_accumulation: SubjectAccumulationEntity, payload: List[dict]) -> List[dict] | None:
+        # Постановка на учет без блокировки субъекта с повтором при конфликте; None - повторы исчерпаны
+        for retries in range(settings.LAS_OPTIMISTIC_MAX_RETRIES + 1):
+            try:
+                results = RegisterAddOptimistic(
+                    user=self.user,
+                    subject_accumulation=subject_accumulation,
+                    payload=payload,
+                ).add()
+            except OptimisticConflict as exc:
+                optimistic_metrics.observe_conflict()
+                self.log(msg=f'Optimistic conflict: {exc}. Retries: `{retries}`.')
+                continue
+            except OperationalError as exc:
+                # Взаимоблокировка с параллельной операцией, блокирующей строки остатков в другом порядке
+                if getattr(exc.__cause__, 'pgcode', None) != DEADLOCK_DETECTED_PGCODE:
+                    raise
+                optimistic_metrics.observe_conflict()
+                self.log(msg=f'Optimistic deadlock: {exc}. Retries: `{retries}`.')
+                continue
+            optimistic_metrics.observe_success(retries)
+            return results
+
+        optimistic_metrics.observe_fallback()
+        return None
+
+    def add(
+            self,
+            subject_accumulation: SubjectAccumulationEntity,
+            payload: List[dict],
+            write_mode: str | None = None,
+    ) -> List[dict]:
         """
 
         :param subject_accumulation:
@@ -68,12 +145,34 @@ class LiabilityAccountingSystem(LoggerMixin):
             словарь вида: IncrementResult().asdict(),
             словарь вида: IncrementResult().asdict(),
         ]
+        :param write_mode: WRITE_MODE_LOCK, WRITE_MODE_OPTIMISTIC или WRITE_MODE_ATOMIC
+        (None - settings.LAS_WRITE_MODE)
         """
-        with get_lock(
+        write_mode = write_mode or settings.LAS_WRITE_MODE
+        self.check_write_mode(write_mode=write_mode)
+        # Субъект накопления создается до блокировки: блокировка `row` блокирует строки остатков субъекта
+        subject_accumulation.ensure_created()
+        if write_mode == WRITE_MODE_ATOMIC:
+            return RegisterAddAtomic(
+                user=self.user,
+                subject_accumulation=subject_accumulation,
+                payload=payload,
+            ).add()
+
+        register_add_class = RegisterAdd
+        if write_mode == WRITE_MODE_OPTIMISTIC:
+            results = self.add_optimistic(subject_accumulation=subject_accumulation, payload=payload)
+            if results is not None:
+                return results
+            # Параллельные оптимистичные операции не берут блокировку субъекта,
+            # поэтому после исчерпания повторов остаток вычисляется в базе
+            register_add_class = RegisterAddAtomic
+        with hold_locks(get_lock(
                 instance_id=self.user.instance.id,
                 subject_id=subject_accumulation.external_id,
-        ):
-            return RegisterAdd(
+                liabilities_type_ids=[liability['accumulation_section_id'] for liability in payload],
+        )):
+            return register_add_class(
                 user=self.user,
                 subject_accumulation=subject_accumulation,
                 payload=payload,
@@ -82,6 +181,7 @@ class LiabilityAccountingSystem(LoggerMixin):
     def cancel(
             self,
             payload: List[dict],
+            single_transaction: bool = True,
     ) -> List[dict]:
         """
 
@@ -97,22 +197,24 @@ class LiabilityAccountingSystem(LoggerMixin):
             словарь вида: CancelResult().asdict(),
             словарь вида: CancelResult().asdict(),
         ]
+        :param single_transaction: True - все субъекты обрабатываются в одной транзакции под блокировками всех субъектов,
+        False - каждый субъект в собственной транзакции под собственной блокировкой
         """
-        for subject_accumulation, payload in LiabilityAccountingSystem.get_groupby_payload(
+        return self.process_subject_groups(
+            subject_groups=LiabilityAccountingSystem.get_groupby_payload(
                 payload=payload,
-        ):
-            with get_lock(
-                    instance_id=self.user.instance.id,
-                    subject_id=subject_accumulation.external_id,
-            ):
-                return RegisterCancel(
-                    user=self.user,
-                    payload=list(payload),
-                ).cancel()
+            ),
+            handler=lambda group_payload: RegisterCancel(
+                user=self.user,
+                payload=group_payload,
+            ).cancel(),
+            single_transaction=single_transaction,
+        )
 
     def edit(
             self,
             payload: List[dict],
+            single_transaction: bool = True,
     ) -> List[dict]:
         """
 
@@ -130,15 +232,68 @@ class LiabilityAccountingSystem(LoggerMixin):
             словарь вида: EditResult().asdict(),
             словарь вида: EditResult().asdict(),
         ]
+        :param single_transaction: True - все субъекты обрабатываются в одной транзакции под блокировками всех субъектов,
+        False - каждый субъект в собственной транзакции под собственной блокировкой
         """
-        for subject_accumulation, payload in LiabilityAccountingSystem.get_groupby_payload(
+        return self.process_subject_groups(
+            subject_groups=LiabilityAccountingSystem.get_groupby_payload(
                 payload=payload,
-        ):
-            with get_lock(
-                    instance_id=self.user.instance.id,
-                    subject_id=subject_accumulation.external_id,
-            ):
-                return RegisterEdit(
-                    user=self.user,
-                    payload=list(payload),
-                ).edit()
+            ),
+            handler=lambda group_payload: RegisterEdit(
+                user=self.user,
+                payload=group_payload,
+            ).edit(),
+            single_transaction=single_transaction,
+        )
+
+    def get_amount_totals_as_of(
+            self,
+            subject_ogrn: str,
+            moment: datetime,
+            liabilities_type_ids: List[int] | None = None,
+    ) -> List[dict]:
+        """
+
+        :param subject_ogrn: ОГРН (ОГРНИП) субъекта накопления
+        :param moment: момент времени, на который требуется остаток
+        :param liabilities_type_ids: идентификаторы видов обязательств инстанции (None - все виды инстанции)
+        :return: [
+            {
+                'accumulation_section_id': 1,
+                'postfix': '7',
+                'amount_total': Decimal('1111.11'),
+            },
+        ]
+        """
+        return BalanceReader(
+            instance_id=self.user.instance.id,
+        ).as_of(
+            subject_ogrn=subject_ogrn,
+            moment=moment,
+            liabilities_type_ids=liabilities_type_ids,
+        )
+
+    def get_current_amount_totals(
+            self,
+            subject_ogrns: List[str],
+            liabilities_type_ids: List[int] | None = None,
+    ) -> List[dict]:
+        """
+
+        :param subject_ogrns: ОГРН (ОГРНИП) субъектов накопления
+        :param liabilities_type_ids: идентификаторы видов обязательств (None - все виды инстанции)
+        :return: [
+            {
+                'subject_ogrn': '1023301286656',
+                'accumulation_section_id': 1,
+                'postfix': '7',
+                'amount_total': Decimal('1111.11'),
+            },
+        ]
+        """
+        return BalanceReader(
+            instance_id=self.user.instance.id,
+        ).current(
+            subject_ogrns=subject_ogrns,
+            liabilities_type_ids=liabilities_type_ids,
+        )
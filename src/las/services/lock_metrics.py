@@ -0,0 +1,206 @@
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, List, Tuple
+
+from django.conf import settings
+from django.db import OperationalError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+logger = logging.getLogger('las')
+
+# Границы интервалов гистограмм, секунды
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Коды ошибок PostgreSQL: lock_not_available (lock_timeout) и query_canceled (statement_timeout)
+LOCK_TIMEOUT_PGCODES = ('55P03', '57014')
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for bucket_index, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                index = bucket_index
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        # Накопленные значения по верхним границам интервалов (как `le` в Prometheus)
+        buckets = {}
+        cumulative = 0
+        for bucket, count in zip([str(bucket) for bucket in self.buckets] + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[bucket] = cumulative
+        return {
+            'buckets': buckets,
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+def is_lock_timeout(exc: BaseException) -> bool:
+    if isinstance(exc, RedisTimeoutError):
+        return True
+    if isinstance(exc, OperationalError):
+        return getattr(exc.__cause__, 'pgcode', None) in LOCK_TIMEOUT_PGCODES
+    return False
+
+
+class LockMetrics:
+    """
+    Метрики блокировок субъектов накопления в памяти процесса: гистограммы ожидания и удержания,
+    счетчики таймаутов, ошибок и продлений, а также наиболее конкурентные ключи за скользящее окно.
+
+    Каждый процесс (worker) накапливает собственные значения.
+    """
+    contended_keys_max_events = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.wait = Histogram()
+            self.hold = Histogram()
+            self.acquisitions = 0
+            self.timeouts = 0
+            self.errors = 0
+            self.renewals = 0
+            self.contended_events: Deque[Tuple[float, str, float]] = deque(maxlen=self.contended_keys_max_events)
+
+    def observe_acquire(self, name: str, wait: float) -> None:
+        now = time.monotonic()
+        with self.lock:
+            self.acquisitions += 1
+            self.wait.observe(wait)
+            if wait >= settings.LAS_LOCK_CONTENDED_WAIT:
+                self.contended_events.append((now, name, wait))
+        if wait >= settings.LAS_LOCK_SLOW_ACQUIRE:
+            logger.warning(f'Slow lock acquisition: key=`{name}`, wait=`{wait:.3f}` s.')
+
+    def observe_release(self, name: str, hold: float) -> None:
+        with self.lock:
+            self.hold.observe(hold)
+
+    def observe_failure(self, name: str, wait: float, exc: BaseException) -> None:
+        timeout = is_lock_timeout(exc)
+        with self.lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.errors += 1
+        logger.warning(
+            f'Lock acquisition failed: key=`{name}`, wait=`{wait:.3f}` s., '
+            f'timeout=`{timeout}`, error=`{exc!r}`.',
+        )
+
+    def observe_renewal(self, name: str) -> None:
+        with self.lock:
+            self.renewals += 1
+
+    def get_contended_keys(self) -> List[dict]:
+        window_start = time.monotonic() - settings.LAS_LOCK_CONTENDED_WINDOW
+        with self.lock:
+            while self.contended_events and self.contended_events[0][0] < window_start:
+                self.contended_events.popleft()
+            events = list(self.contended_events)
+
+        counts = Counter(name for _, name, _ in events)
+        max_waits = {}
+        for _, name, wait in events:
+            max_waits[name] = max(wait, max_waits.get(name, 0))
+        return [
+            {
+                'key': name,
+                'count': count,
+                'max_wait': max_waits[name],
+            }
+            for name, count in counts.most_common(settings.LAS_LOCK_CONTENDED_TOP)
+        ]
+
+    def snapshot(self) -> dict:
+        contended_keys = self.get_contended_keys()
+        with self.lock:
+            return {
+                'acquisitions': self.acquisitions,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'renewals': self.renewals,
+                'wait': self.wait.snapshot(),
+                'hold': self.hold.snapshot(),
+                'contended_keys': contended_keys,
+            }
+
+
+lock_metrics = LockMetrics()
+
+
+class OptimisticMetrics:
+    # Метрики оптимистичной записи в памяти процесса: распределение числа повторов успешных операций,
+    # число конфликтов и переходов на запись под блокировкой после исчерпания повторов
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.retries = Counter()
+            self.conflicts = 0
+            self.fallbacks = 0
+
+    def observe_success(self, retries: int) -> None:
+        with self.lock:
+            self.retries[retries] += 1
+
+    def observe_conflict(self) -> None:
+        with self.lock:
+            self.conflicts += 1
+
+    def observe_fallback(self) -> None:
+        with self.lock:
+            self.fallbacks += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                'retries': {str(retries): count for retries, count in sorted(self.retries.items())},
+                'conflicts': self.conflicts,
+                'fallbacks': self.fallbacks,
+            }
+
+
+optimistic_metrics = OptimisticMetrics()
+
+
+class LockMetricsMixin:
+    # Измерение ожидания и удержания блокировки; класс блокировки должен иметь атрибут `name`
+    acquired_at = None
+
+    def __enter__(self):
+        started_at = time.monotonic()
+        try:
+            result = super().__enter__()
+        except BaseException as exc:
+            lock_metrics.observe_failure(self.name, time.monotonic() - started_at, exc)
+            raise
+        self.acquired_at = time.monotonic()
+        lock_metrics.observe_acquire(self.name, self.acquired_at - started_at)
+        return result
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            lock_metrics.observe_release(self.name, time.monotonic() - self.acquired_at)
@@ -0,0 +1,228 @@
+import hashlib
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Iterable, List
+
+from django.conf import settings
+from django.db import connection, transaction
+from django_redis import get_redis_connection
+from redis_lock import Lock
+
+from las.models.liabilities_type import TypeRunningChoices
+from .lock_metrics import LockMetricsMixin, lock_metrics
+
+
+def get_lock_key(instance_id: int, subject_id: int | str) -> str:
+    return '{instance_id}_{subject_id}'.format(
+        instance_id=instance_id,
+        subject_id=subject_id,
+    )
+
+
+def get_key_hash(name: str) -> int:
+    # 64-битный хэш имени блокировки
+    return int.from_bytes(
+        hashlib.blake2b(name.encode(), digest_size=8).digest(),
+        byteorder='big',
+        signed=True,
+    )
+
+
+class LockStripes:
+    """
+    Локальные блокировки процесса, разделенные на полосы по хэшу имени блокировки.
+
+    Берутся перед распределенной блокировкой: потоки одного процесса, обрабатывающие один субъект,
+    ожидают друг друга локально, и распределенную блокировку ожидает не более одного потока процесса на ключ.
+    """
+
+    def __init__(self, count: int):
+        self.locks = [threading.Lock() for _ in range(count)]
+
+    def get(self, names: Iterable[str]) -> List[threading.Lock]:
+        # Без повторов и по возрастанию номера полосы, чтобы потоки не блокировали друг друга взаимно
+        if not self.locks:
+            return []
+        indexes = sorted({get_key_hash(name) % len(self.locks) for name in names})
+        return [self.locks[index] for index in indexes]
+
+
+_lock_stripes: LockStripes | None = None
+
+
+def get_lock_stripes() -> LockStripes:
+    global _lock_stripes
+    if _lock_stripes is None:
+        _lock_stripes = LockStripes(count=settings.LAS_LOCK_STRIPES)
+    return _lock_stripes
+
+
+class RedisLock(LockMetricsMixin, Lock):
+    # Распределенная блокировка в Redis (`registration_accounting_events`) с автоматическим продлением
+
+    def __init__(
+            self,
+            instance_id: int,
+            subject_id: int | str,
+            expire: int = 10,
+            auto_renewal: bool = True,
+            **kwargs,
+    ):
+        self.name = get_lock_key(instance_id=instance_id, subject_id=subject_id)
+        super().__init__(
+            redis_client=get_redis_connection('registration_accounting_events'),
+            name=self.name,
+            expire=expire,
+            auto_renewal=auto_renewal,
+        )
+
+    def extend(self, expire=None):
+        lock_metrics.observe_renewal(self.name)
+        return super().extend(expire=expire)
+
+
+class TransactionLock:
+    # Блокировка PostgreSQL, которая берется внутри transaction.atomic() и снимается вместе с транзакцией
+    name: str = None
+    atomic = None
+
+    def acquire(self, cursor) -> None:
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.atomic = transaction.atomic()
+        self.atomic.__enter__()
+        try:
+            with connection.cursor() as cursor:
+                self.acquire(cursor)
+        except BaseException as exc:
+            self.atomic.__exit__(type(exc), exc, exc.__traceback__)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self.atomic.__exit__(exc_type, exc_value, traceback)
+
+
+class AdvisoryLock(LockMetricsMixin, TransactionLock):
+    """
+    Транзакционная advisory-блокировка PostgreSQL (pg_advisory_xact_lock).
+
+    Блокировка берется внутри transaction.atomic() и снимается вместе с транзакцией, поэтому не может пережить
+    аварийно завершившуюся транзакцию. Внутри внешней транзакции блокировка удерживается до её завершения.
+    """
+
+    def __init__(self, instance_id: int, subject_id: int | str, **kwargs):
+        self.name = get_lock_key(instance_id=instance_id, subject_id=subject_id)
+
+    @property
+    def key(self) -> int:
+        # 64-битный ключ advisory-блокировки из имени блокировки
+        return get_key_hash(self.name)
+
+    def acquire(self, cursor) -> None:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [self.key])
+
+
+class BalanceRowLock(LockMetricsMixin, TransactionLock):
+    """
+    Блокировка строк остатков las_subjectbalance (SELECT ... FOR UPDATE) по видам обязательств субъекта.
+
+    Операции над разными видами обязательств одного субъекта выполняются параллельно.
+    Недостающие строки остатков внутреннего учета видов обязательств инстанции создаются с нулевым остатком,
+    чтобы было что блокировать: триггер update_subject_balance заменит остаток при первой записи в регистр.
+    Строки блокируются в порядке идентификаторов видов обязательств. Субъект накопления должен существовать.
+    """
+    create_rows_sql = '''
+        INSERT INTO las_subjectbalance (
+            created_at, changed_at, instance_id, subject_id, liabilities_type_id, amount_total, last_register_id, version
+        )
+        SELECT now(), now(), %(instance_id)s, s.id, t.id, 0, NULL, 0
+        FROM las_subjectaccumulation s
+        JOIN las_liabilitiestype t ON t.type_running = %(type_running)s
+        WHERE s.ogrn = %(ogrn)s
+          AND t.instance_id = %(instance_id)s
+          AND (t.id = ANY(%(liabilities_type_ids)s) OR %(all_types)s)
+        ORDER BY t.id
+        ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO NOTHING
+    '''
+    lock_rows_sql = '''
+        SELECT b.id
+        FROM las_subjectbalance b
+        JOIN las_subjectaccumulation s ON s.id = b.subject_id
+        WHERE b.instance_id = %(instance_id)s
+          AND s.ogrn = %(ogrn)s
+          AND (b.liabilities_type_id = ANY(%(liabilities_type_ids)s) OR %(all_types)s)
+        ORDER BY b.liabilities_type_id
+        FOR UPDATE OF b
+    '''
+
+    def __init__(
+            self,
+            instance_id: int,
+            subject_id: int | str,
+            liabilities_type_ids: Iterable[int] | None = None,
+            **kwargs,
+    ):
+        """
+
+        :param subject_id: ОГРН (ОГРНИП) субъекта накопления
+        :param liabilities_type_ids: идентификаторы видов обязательств (None - все виды обязательств инстанции)
+        """
+        self.name = get_lock_key(instance_id=instance_id, subject_id=subject_id)
+        self.instance_id = instance_id
+        self.subject_id = subject_id
+        self.liabilities_type_ids = sorted(set(liabilities_type_ids)) if liabilities_type_ids is not None else None
+
+    def acquire(self, cursor) -> None:
+        params = {
+            'instance_id': self.instance_id,
+            'ogrn': self.subject_id,
+            'liabilities_type_ids': self.liabilities_type_ids or [],
+            'all_types': self.liabilities_type_ids is None,
+            'type_running': TypeRunningChoices.INTERNAL.value[0],
+        }
+        cursor.execute(self.create_rows_sql, params)
+        cursor.execute(self.lock_rows_sql, params)
+
+
+LOCK_BACKENDS = {
+    'redis': RedisLock,
+    'advisory': AdvisoryLock,
+    'row': BalanceRowLock,
+}
+
+
+def get_lock(
+        instance_id: int,
+        subject_id: int | str,
+        expire: int = 10,
+        auto_renewal: bool = True,
+        liabilities_type_ids: Iterable[int] | None = None,
+) -> RedisLock | AdvisoryLock | BalanceRowLock:
+    """
+
+    :param liabilities_type_ids: виды обязательств, затрагиваемые операцией (используются блокировкой `row`)
+    """
+    lock_class = LOCK_BACKENDS[settings.LAS_LOCK_BACKEND]
+    return lock_class(
+        instance_id=instance_id,
+        subject_id=subject_id,
+        expire=expire,
+        auto_renewal=auto_renewal,
+        liabilities_type_ids=liabilities_type_ids,
+    )
+
+
+@contextmanager
+def hold_locks(*locks: RedisLock | AdvisoryLock | BalanceRowLock):
+    """
+    Захват блокировок: сначала локальные полосы всех блокировок, затем распределенные блокировки
+    в переданном порядке (вызывающий код передает их в детерминированном порядке).
+    """
+    with ExitStack() as stack:
+        for stripe in get_lock_stripes().get(lock.name for lock in locks):
+            stack.enter_context(stripe)
+        for lock in locks:
+            stack.enter_context(lock)
+        yield
@@ -1,19 +1,28 @@
+from collections import Counter
 from dataclasses import dataclass, asdict
 from decimal import Decimal
-from typing import List, Type
+from typing import Dict, Iterator, List, Tuple, Type
 
-from django.db import transaction
+from django.db import connection, transaction
+from django.utils import timezone
 
 from las.logger import LoggerMixin
 from las.models import (
     User,
-    LiabilitiesType,
     AccumulationRegister,
 )
 from las.models.liabilities_type import TypeRunningChoices
+from las.services.locks import BalanceRowLock
+from las.services.tools.liabilities_type_registry import LiabilitiesTypeEntry, get_liabilities_type_registry
+from las.services.tools.receipt_number_allocator import ReceiptNumberAllocator
 from las.services.tools.subject_accumulation import SubjectAccumulationEntity
 
 
+class OptimisticConflict(Exception):
+    # Остаток изменен параллельной операцией после чтения
+    pass
+
+
 @dataclass
 class IncrementResult:
     success: bool
@@ -41,8 +50,9 @@ class RegisterAddStrategyBase(RegisterAddBase):
     def add(
             self,
             increment_amount: Decimal,
-            liabilities_type: LiabilitiesType | None,
-            forced_receipt_number: str | None = None
+            liabilities_type: LiabilitiesTypeEntry | None,
+            forced_receipt_number: str | None = None,
+            forced_receipt_serial: int | None = None,
     ) -> IncrementResult:
         raise NotImplementedError
 
@@ -50,43 +60,215 @@ class RegisterAddStrategyBase(RegisterAddBase):
 class RegisterAddStrategyInsideLiabilitiesType(RegisterAddStrategyBase):
     # Обработка `ВНУТРЕННЕГО` типа ведения учета
 
+    def get_last_total_amount(self, liabilities_type: LiabilitiesTypeEntry) -> Decimal:
+        return self.subject_accumulation.get_last_total_instance_amount(
+            instance_id=self.user.instance.id,
+            liabilities_type_id=liabilities_type.id,
+        )
+
+    def set_last_total_amount(self, liabilities_type: LiabilitiesTypeEntry, amount_total: Decimal):
+        self.subject_accumulation.set_last_total_instance_amount(
+            instance_id=self.user.instance.id,
+            liabilities_type_id=liabilities_type.id,
+            amount_total=amount_total,
+        )
+
     def add(
             self,
             increment_amount: Decimal,
-            liabilities_type: LiabilitiesType | None,
-            forced_receipt_number: str | None = None
+            liabilities_type: LiabilitiesTypeEntry | None,
+            forced_receipt_number: str | None = None,
+            forced_receipt_serial: int | None = None,
     ) -> IncrementResult:
-        last_total_amount = self.subject_accumulation.get_last_total_instance_amount(
-            instance_id=self.user.instance.id,
-            liabilities_type_id=liabilities_type.id,
-        )
+        last_total_amount = self.get_last_total_amount(liabilities_type=liabilities_type)
+        amount_total = last_total_amount + increment_amount
         accumulation_register = AccumulationRegister.objects.create(
             user=self.user,
-            liabilities_type=liabilities_type,
-            subject=self.subject_accumulation.model_instance,
+            instance=self.user.instance,
+            liabilities_type_id=liabilities_type.id,
+            subject_id=self.subject_accumulation.subject_id,
             amount_record=increment_amount,
-            amount_total=last_total_amount + increment_amount,
+            amount_total=amount_total,
             receipt_number=forced_receipt_number,
+            receipt_serial=forced_receipt_serial,
         )
-        accumulation_register.refresh_from_db(fields=['receipt_number'])
+        self.set_last_total_amount(liabilities_type=liabilities_type, amount_total=amount_total)
         increment_result = IncrementResult(
             success=True,
             receipt_number=accumulation_register.receipt_number,
-            postfix=accumulation_register.liabilities_type.postfix,
-            amount_record=accumulation_register.amount_record,
-            amount_total=accumulation_register.amount_total,
+            postfix=liabilities_type.postfix,
+            amount_record=increment_amount,
+            amount_total=amount_total,
         )
         return increment_result
 
 
+class RegisterAddStrategyInsideLiabilitiesTypeOptimistic(RegisterAddStrategyInsideLiabilitiesType):
+    """
+    Обработка `ВНУТРЕННЕГО` типа ведения учета без блокировки субъекта.
+
+    Остатки закрепляются до обработки записей (RegisterAddOptimistic.claim_last_total_amounts),
+    цепочка остатков по записям одного вида обязательств продолжается в памяти.
+    Кэш остатков не используется: он корректен только под блокировкой субъекта.
+    """
+
+    def __init__(
+            self,
+            user: User,
+            subject_accumulation: SubjectAccumulationEntity,
+            claimed_amount_totals: Dict[int, Decimal],
+    ):
+        super().__init__(user=user, subject_accumulation=subject_accumulation)
+        self.claimed_amount_totals = claimed_amount_totals
+
+    def get_last_total_amount(self, liabilities_type: LiabilitiesTypeEntry) -> Decimal:
+        return self.claimed_amount_totals[liabilities_type.id]
+
+    def set_last_total_amount(self, liabilities_type: LiabilitiesTypeEntry, amount_total: Decimal):
+        self.claimed_amount_totals[liabilities_type.id] = amount_total
+        self.subject_accumulation.invalidate_last_total_instance_amount(
+            instance_id=self.user.instance.id,
+            liabilities_type_id=liabilities_type.id,
+        )
+
+
+class RegisterAddStrategyInsideLiabilitiesTypeAtomic(RegisterAddStrategyInsideLiabilitiesType):
+    """
+    Обработка `ВНУТРЕННЕГО` типа ведения учета одним запросом без блокировки субъекта.
+
+    Остаток вычисляется в базе: upsert строки остатка прибавляет приращение и возвращает новый остаток,
+    который записывается в регистр тем же запросом. Параллельные операции по одному ключу
+    (инстанция, субъект, вид обязательств) упорядочиваются блокировкой строки остатка, которую
+    ON CONFLICT DO UPDATE удерживает до конца транзакции; при первой записи гонку вставок разрешает
+    уникальный индекс unique_subject_balance. Триггер tr_ai_update_subject_balance затем записывает в строку
+    тот же остаток, идентификатор записи регистра и новую версию.
+    Кэш остатков не используется: он корректен только под блокировкой субъекта.
+    """
+    add_sql = '''
+        WITH balance AS (
+            INSERT INTO las_subjectbalance (
+                created_at, changed_at, instance_id, subject_id, liabilities_type_id,
+                amount_total, last_register_id, version
+            )
+            VALUES (%(now)s, %(now)s, %(instance_id)s, %(subject_id)s, %(liabilities_type_id)s, %(amount_record)s, NULL, 0)
+            ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO UPDATE
+                SET amount_total = las_subjectbalance.amount_total + EXCLUDED.amount_total
+            RETURNING amount_total
+        )
+        INSERT INTO las_accumulationregister (
+            created_at, changed_at, user_id, instance_id, subject_id, liabilities_type_id,
+            amount_record, amount_total, receipt_number, receipt_serial
+        )
+        SELECT %(now)s, %(now)s, %(user_id)s, %(instance_id)s, %(subject_id)s, %(liabilities_type_id)s,
+               %(amount_record)s, balance.amount_total, %(receipt_number)s, %(receipt_serial)s
+        FROM balance
+        RETURNING receipt_number, amount_total
+    '''
+
+    def add(
+            self,
+            increment_amount: Decimal,
+            liabilities_type: LiabilitiesTypeEntry | None,
+            forced_receipt_number: str | None = None,
+            forced_receipt_serial: int | None = None,
+    ) -> IncrementResult:
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute(self.add_sql, {
+                'now': now,
+                'user_id': self.user.id,
+                'instance_id': self.user.instance.id,
+                'subject_id': self.subject_accumulation.subject_id,
+                'liabilities_type_id': liabilities_type.id,
+                'amount_record': increment_amount,
+                'receipt_number': forced_receipt_number or None,
+                'receipt_serial': forced_receipt_serial,
+            })
+            receipt_number, amount_total = cursor.fetchone()
+        self.subject_accumulation.invalidate_last_total_instance_amount(
+            instance_id=self.user.instance.id,
+            liabilities_type_id=liabilities_type.id,
+        )
+        increment_result = IncrementResult(
+            success=True,
+            receipt_number=receipt_number,
+            postfix=liabilities_type.postfix,
+            amount_record=increment_amount,
+            amount_total=amount_total,
+        )
+        return increment_result
+
+
+class RegisterAddBatchInsideLiabilitiesType(RegisterAddBase):
+    """
+    Обработка нескольких записей `ВНУТРЕННЕГО` типа ведения учета под блокировкой субъекта.
+
+    Остатки всех видов обязательств читаются одним запросом, цепочка остатков по записям одного вида
+    обязательств продолжается в памяти, записи регистра вставляются одним запросом (номера квитанций
+    возвращаются через INSERT ... RETURNING). Результат по каждой записи совпадает
+    с RegisterAddStrategyInsideLiabilitiesType.
+    """
+    log_prefix = 'RegisterAddBatch'
+
+    def add(
+            self,
+            items: List[Tuple[Decimal, LiabilitiesTypeEntry, str | None, int | None]],
+    ) -> List[IncrementResult]:
+        """
+
+        :param items: [(increment_amount, liabilities_type, forced_receipt_number, forced_receipt_serial), ...]
+        """
+        last_total_amounts = self.subject_accumulation.get_last_total_instance_amounts(
+            instance_id=self.user.instance.id,
+            liabilities_type_ids={liabilities_type.id for _, liabilities_type, _, _ in items},
+        )
+        amount_totals = []
+        accumulation_registers = []
+        for increment_amount, liabilities_type, forced_receipt_number, forced_receipt_serial in items:
+            amount_total = last_total_amounts[liabilities_type.id] + increment_amount
+            last_total_amounts[liabilities_type.id] = amount_total
+            amount_totals.append(amount_total)
+            accumulation_registers.append(AccumulationRegister(
+                user=self.user,
+                instance=self.user.instance,
+                liabilities_type_id=liabilities_type.id,
+                subject_id=self.subject_accumulation.subject_id,
+                amount_record=increment_amount,
+                amount_total=amount_total,
+                receipt_number=forced_receipt_number,
+                receipt_serial=forced_receipt_serial,
+            ))
+        AccumulationRegister.objects.bulk_create(accumulation_registers)
+
+        for liabilities_type_id, amount_total in last_total_amounts.items():
+            self.subject_accumulation.set_last_total_instance_amount(
+                instance_id=self.user.instance.id,
+                liabilities_type_id=liabilities_type_id,
+                amount_total=amount_total,
+            )
+        return [
+            IncrementResult(
+                success=True,
+                receipt_number=accumulation_register.receipt_number,
+                postfix=liabilities_type.postfix,
+                amount_record=increment_amount,
+                amount_total=amount_total,
+            )
+            for accumulation_register, (increment_amount, liabilities_type, _, _), amount_total in zip(
+                accumulation_registers, items, amount_totals,
+            )
+        ]
+
+
 class RegisterAddStrategyOutsideLiabilitiesType(RegisterAddStrategyBase):
     # Обработка `ВНЕШНЕГО` типа ведения учета
 
     def add(
             self,
             increment_amount: Decimal,
-            liabilities_type: LiabilitiesType | None,
-            forced_receipt_number: str | None = None
+            liabilities_type: LiabilitiesTypeEntry | None,
+            forced_receipt_number: str | None = None,
+            forced_receipt_serial: int | None = None,
     ) -> IncrementResult:
         increment_result = IncrementResult(
             success=False,
@@ -100,8 +282,9 @@ class RegisterAddStrategyUnknownLiabilitiesType(RegisterAddStrategyBase):
     def add(
             self,
             increment_amount: Decimal,
-            liabilities_type: LiabilitiesType | None,
-            forced_receipt_number: str | None = None
+            liabilities_type: LiabilitiesTypeEntry | None,
+            forced_receipt_number: str | None = None,
+            forced_receipt_serial: int | None = None,
     ):
         increment_result = IncrementResult(
             success=False,
@@ -124,7 +307,7 @@ class RegisterAdd(RegisterAddBase):
 
     @staticmethod
     def get_liability_type_strategy(
-            liabilities_type: LiabilitiesType | None = None,
+            liabilities_type: LiabilitiesTypeEntry | None = None,
     ) -> Type[RegisterAddStrategyBase]:
         if liabilities_type is None:
             return RegisterAddStrategyUnknownLiabilitiesType
@@ -135,30 +318,191 @@ class RegisterAdd(RegisterAddBase):
         }
         return liabilities_type_map.get(liabilities_type.type_running)
 
+    def allocate_receipt_numbers(
+            self,
+            liabilities_types: List[LiabilitiesTypeEntry | None],
+    ) -> Dict[int, Iterator[Tuple[str, int]]]:
+        # Для нескольких записей внутреннего учета номера квитанций резервируются одним запросом
+        counts = Counter(
+            liabilities_type.id
+            for liabilities_type in liabilities_types
+            if liabilities_type is not None and liabilities_type.type_running == TypeRunningChoices.INTERNAL.value[0]
+        )
+        if sum(counts.values()) < 2:
+            return {}
+        receipt_numbers = ReceiptNumberAllocator(instance_id=self.user.instance.id).allocate(counts=counts)
+        return {
+            liabilities_type_id: iter(numbers)
+            for liabilities_type_id, numbers in receipt_numbers.items()
+        }
+
+    def get_strategy(self, strategy_class: Type[RegisterAddStrategyBase]) -> RegisterAddStrategyBase:
+        return strategy_class(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+        )
+
     def add(self, forced_receipt_number: str | None = None) -> List[dict]:
         with transaction.atomic():
-            results = []
-            for liability in self.payload:
-                liabilities_type = LiabilitiesType.objects.filter(pk=liability['accumulation_section_id']).last()
-                strategy_class = self.get_liability_type_strategy(liabilities_type=liabilities_type)
-
-                self.log(
-                    msg=f'liabilities_type.id=`{liabilities_type.id if liabilities_type else None}, '
-                        f'liabilities_type.type_running=`{liabilities_type.type_running if liabilities_type else None}`, '
-                        f'strategy_class=`{strategy_class}`.'
-                        f'liability: `{liability}`. '
-                        f'Init add.',
+            return self.add_payload(forced_receipt_number=forced_receipt_number)
+
+    def get_liabilities_types(self) -> List[LiabilitiesTypeEntry | None]:
+        liabilities_types = get_liabilities_type_registry().get_many(
+            {liability['accumulation_section_id'] for liability in self.payload},
+        )
+        return [liabilities_types.get(liability['accumulation_section_id']) for liability in self.payload]
+
+    def add_payload(self, forced_receipt_number: str | None = None) -> List[dict]:
+        liabilities_types = self.get_liabilities_types()
+        allocated_receipt_numbers = {}
+        if forced_receipt_number is None:
+            allocated_receipt_numbers = self.allocate_receipt_numbers(liabilities_types=liabilities_types)
+        strategy_classes = [
+            self.get_liability_type_strategy(liabilities_type=liabilities_type)
+            for liabilities_type in liabilities_types
+        ]
+        # Несколько записей внутреннего учета под блокировкой субъекта записываются одной вставкой. Пакет
+        # используется только в режиме `lock`: RegisterAddOptimistic и RegisterAddAtomic подменяют стратегию
+        # и обрабатывают записи по одной
+        use_batch = strategy_classes.count(RegisterAddStrategyInsideLiabilitiesType) >= 2
+
+        results = {}
+        batch_indexes = []
+        batch_items = []
+        for index, (liability, liabilities_type, strategy_class) in enumerate(
+                zip(self.payload, liabilities_types, strategy_classes),
+        ):
+            self.log(
+                msg=f'liabilities_type.id=`{liabilities_type.id if liabilities_type else None}, '
+                    f'liabilities_type.type_running=`{liabilities_type.type_running if liabilities_type else None}`, '
+                    f'strategy_class=`{strategy_class}`.'
+                    f'liability: `{liability}`. '
+                    f'Init add.',
+            )
+            if strategy_class is not None:
+                receipt_number, receipt_serial = forced_receipt_number, None
+                if liabilities_type is not None and liabilities_type.id in allocated_receipt_numbers:
+                    receipt_number, receipt_serial = next(allocated_receipt_numbers[liabilities_type.id])
+                if use_batch and strategy_class is RegisterAddStrategyInsideLiabilitiesType:
+                    batch_indexes.append(index)
+                    batch_items.append(
+                        (liability['increment_amount'], liabilities_type, receipt_number, receipt_serial),
+                    )
+                    continue
+                results[index] = self.get_strategy(strategy_class=strategy_class).add(
+                    increment_amount=liability['increment_amount'],
+                    liabilities_type=liabilities_type,
+                    forced_receipt_number=receipt_number,
+                    forced_receipt_serial=receipt_serial,
                 )
-                if strategy_class is not None:
-                    results.append(strategy_class(
-                        user=self.user,
-                        subject_accumulation=self.subject_accumulation,
-                    ).add(
-                        increment_amount=liability['increment_amount'],
-                        liabilities_type=liabilities_type,
-                        forced_receipt_number=forced_receipt_number,
-                    ))
-
-            results = list(map(asdict, results))
-            self.log(msg=f'Added: `{results}`')
-            return results
+
+        if batch_items:
+            results.update(zip(batch_indexes, RegisterAddBatchInsideLiabilitiesType(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+            ).add(items=batch_items)))
+
+        results = [asdict(results[index]) for index in sorted(results)]
+        self.log(msg=f'Added: `{results}`')
+        return results
+
+
+class RegisterAddOptimistic(RegisterAdd):
+    """
+    Постановка на учет без блокировки субъекта.
+
+    Остаток каждого вида обязательств внутреннего учета читается вместе с версией строки остатка и закрепляется
+    условным обновлением по версии; если версия изменилась, выбрасывается OptimisticConflict и операция
+    повторяется вызывающим кодом.
+
+    Закрепление удерживает блокировку строки остатка до конца транзакции. Параллельная операция по тому же ключу
+    ожидает фиксации всей транзакции закрепившей строку операции, затем перечитывает строку (READ COMMITTED),
+    не находит прочитанной версии и повторяет попытку. Поэтому при частых операциях по одному ключу режим
+    обходится дороже блокировки субъекта и предназначен для ключей с редкими конфликтами.
+    Строки закрепляются по возрастанию идентификатора вида обязательств, поэтому операции над несколькими
+    видами обязательств не блокируют друг друга взаимно.
+    """
+    log_prefix = 'RegisterAddOptimistic'
+
+    def __init__(
+            self,
+            user: User,
+            subject_accumulation: SubjectAccumulationEntity,
+            payload: List[dict],
+    ):
+        super().__init__(user=user, subject_accumulation=subject_accumulation, payload=payload)
+        self.claimed_amount_totals: Dict[int, Decimal] = {}
+
+    def claim_last_total_amounts(self, liabilities_types: List[LiabilitiesTypeEntry | None]) -> Dict[int, Decimal]:
+        claimed_amount_totals = {}
+        for liabilities_type_id in sorted({
+            liabilities_type.id
+            for liabilities_type in liabilities_types
+            if self.get_liability_type_strategy(liabilities_type) is RegisterAddStrategyInsideLiabilitiesTypeOptimistic
+        }):
+            amount_total = self.subject_accumulation.claim_last_total_instance_amount(
+                instance_id=self.user.instance.id,
+                liabilities_type_id=liabilities_type_id,
+            )
+            if amount_total is None:
+                raise OptimisticConflict(
+                    f'instance_id=`{self.user.instance.id}`, '
+                    f'subject=`{self.subject_accumulation.external_id}`, '
+                    f'liabilities_type_id=`{liabilities_type_id}`',
+                )
+            claimed_amount_totals[liabilities_type_id] = amount_total
+        return claimed_amount_totals
+
+    def get_liabilities_types(self) -> List[LiabilitiesTypeEntry | None]:
+        # Остатки закрепляются сразу после определения видов обязательств, до обработки записей
+        liabilities_types = super().get_liabilities_types()
+        self.claimed_amount_totals = self.claim_last_total_amounts(liabilities_types=liabilities_types)
+        return liabilities_types
+
+    def get_strategy(self, strategy_class: Type[RegisterAddStrategyBase]) -> RegisterAddStrategyBase:
+        if strategy_class is RegisterAddStrategyInsideLiabilitiesTypeOptimistic:
+            return strategy_class(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+                claimed_amount_totals=self.claimed_amount_totals,
+            )
+        return super().get_strategy(strategy_class=strategy_class)
+
+    @staticmethod
+    def get_liability_type_strategy(
+            liabilities_type: LiabilitiesTypeEntry | None = None,
+    ) -> Type[RegisterAddStrategyBase]:
+        strategy_class = RegisterAdd.get_liability_type_strategy(liabilities_type=liabilities_type)
+        if strategy_class is RegisterAddStrategyInsideLiabilitiesType:
+            return RegisterAddStrategyInsideLiabilitiesTypeOptimistic
+        return strategy_class
+
+
+class RegisterAddAtomic(RegisterAdd):
+    # Постановка на учет без блокировки субъекта, остаток вычисляется в базе
+    # (см. RegisterAddStrategyInsideLiabilitiesTypeAtomic)
+    log_prefix = 'RegisterAddAtomic'
+
+    @staticmethod
+    def get_liability_type_strategy(
+            liabilities_type: LiabilitiesTypeEntry | None = None,
+    ) -> Type[RegisterAddStrategyBase]:
+        strategy_class = RegisterAdd.get_liability_type_strategy(liabilities_type=liabilities_type)
+        if strategy_class is RegisterAddStrategyInsideLiabilitiesType:
+            return RegisterAddStrategyInsideLiabilitiesTypeAtomic
+        return strategy_class
+
+    def add(self, forced_receipt_number: str | None = None) -> List[dict]:
+        # Одна запись - один запрос, который атомарен сам по себе: транзакция не открывается
+        if len(self.payload) == 1:
+            return self.add_payload(forced_receipt_number=forced_receipt_number)
+        # Несколько записей: строки остатков создаются и блокируются заранее по возрастанию идентификатора
+        # вида обязательств (как блокировкой `row` и RegisterAddOptimistic.claim_last_total_amounts);
+        # upsert в порядке записей запроса взаимно блокировал бы операции с обратным порядком видов обязательств
+        self.subject_accumulation.ensure_created()
+        with BalanceRowLock(
+                instance_id=self.user.instance.id,
+                subject_id=self.subject_accumulation.external_id,
+                liabilities_type_ids=[liability['accumulation_section_id'] for liability in self.payload],
+        ):
+            return self.add_payload(forced_receipt_number=forced_receipt_number)
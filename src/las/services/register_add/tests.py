@@ -1,12 +1,17 @@
 from collections import OrderedDict
 from decimal import Decimal
 
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
 
 from las.factories import LiabilitiesTypeFactory
-from las.models import LiabilitiesType, AccumulationRegister
+from las.models import LiabilitiesType, AccumulationRegister, SubjectBalance
 from las.models.liabilities_type import TypeRunningChoices
 from las.services.register_add.handlers import RegisterAdd
+from las.services.tools.balance_cache import BalanceCache
+from las.services.tools.liabilities_type_registry import get_liabilities_type_registry
+from las.services.tools.receipt_number import ReceiptNumberEntity
+from las.services.tools.receipt_number_allocator import ReceiptNumberAllocator
 from las.test_mixin import TestsMixin
 
 
@@ -57,6 +62,7 @@ class RegisterAddTestCase(TestsMixin, TestCase):
         ).first()
         self.assertIsNotNone(first_accumulation_register)
         self.assertIsNotNone(first_accumulation_register.receipt_number)
+        self.assertEqual(first_accumulation_register.instance, self.instance)
         second_accumulation_register = AccumulationRegister.objects.filter(
             amount_record=payload[3]['increment_amount'],
             amount_total=payload[3]['increment_amount'] + first_accumulation_register.amount_total,
@@ -98,3 +104,267 @@ class RegisterAddTestCase(TestsMixin, TestCase):
                 }
             ]
         )
+
+    @override_settings(LAS_BALANCE_CACHE_ENABLED=True)
+    def test_add_updates_balance_cache_on_commit(self):
+        balance_cache = BalanceCache()
+        cache_key_kwargs = {
+            'instance_id': self.instance.id,
+            'subject_id': self.subject_accumulation.model_instance.id,
+            'liabilities_type_id': self.liability_internal_accounting.id,
+        }
+        balance_cache.invalidate(**cache_key_kwargs)
+        payload = [
+            OrderedDict([
+                ('accumulation_section_id', self.liability_internal_accounting.id),
+                ('increment_amount', Decimal('1111.11')),
+            ]),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            RegisterAdd(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+            ).add()
+        self.assertEqual(balance_cache.get(**cache_key_kwargs), Decimal('1111.11'))
+
+        with self.assertRaises(RuntimeError):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    RegisterAdd(
+                        user=self.user,
+                        subject_accumulation=self.subject_accumulation,
+                        payload=payload,
+                    ).add()
+                    raise RuntimeError
+        self.assertIsNone(balance_cache.get(**cache_key_kwargs))
+
+    @override_settings(LAS_BALANCE_CACHE_ENABLED=True, LAS_LOCK_BACKEND='advisory')
+    def test_balance_cache_disabled_for_transaction_scoped_locks(self):
+        # Блокировка снимается при фиксации, до записи кэша в transaction.on_commit
+        self.assertFalse(BalanceCache.is_enabled())
+        with override_settings(LAS_LOCK_BACKEND='row'):
+            self.assertFalse(BalanceCache.is_enabled())
+        with override_settings(LAS_LOCK_BACKEND='redis'):
+            self.assertTrue(BalanceCache.is_enabled())
+
+    def test_add_allocates_receipt_numbers(self):
+        single_result = RegisterAdd(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('1.00')),
+                ]),
+            ],
+        ).add()
+        trigger_receipt_number = ReceiptNumberEntity(receipt_number=single_result[0]['receipt_number'])
+
+        result = RegisterAdd(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('2.00')),
+                ]),
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('3.00')),
+                ]),
+            ],
+        ).add()
+
+        allocator = ReceiptNumberAllocator(instance_id=self.instance.id)
+        self.assertListEqual(
+            [item['receipt_number'] for item in result],
+            [
+                allocator.format(self.liability_internal_accounting.id, trigger_receipt_number.paid_id + 1),
+                allocator.format(self.liability_internal_accounting.id, trigger_receipt_number.paid_id + 2),
+            ],
+        )
+        # Порядковые номера записываются вместе с зарезервированными номерами квитанций
+        self.assertListEqual(
+            list(AccumulationRegister.objects.filter(
+                receipt_number__in=[item['receipt_number'] for item in result],
+            ).order_by('id').values_list('receipt_serial', flat=True)),
+            [trigger_receipt_number.paid_id + 1, trigger_receipt_number.paid_id + 2],
+        )
+        self.assertEqual(
+            allocator.format(self.liability_internal_accounting.id, trigger_receipt_number.paid_id),
+            trigger_receipt_number.number,
+        )
+
+    def test_add_single_item_queries(self):
+        # Номер квитанции, назначенный триггером, возвращается той же вставкой (INSERT ... RETURNING)
+        get_liabilities_type_registry().get_many([self.liability_internal_accounting.id])
+        self.subject_accumulation.ensure_created()
+        # SAVEPOINT, чтение остатка, INSERT ... RETURNING, RELEASE SAVEPOINT
+        with self.assertNumQueries(4):
+            result = RegisterAdd(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+                payload=[
+                    OrderedDict([
+                        ('accumulation_section_id', self.liability_internal_accounting.id),
+                        ('increment_amount', Decimal('1.00')),
+                    ]),
+                ],
+            ).add()
+        self.assertTrue(result[0]['receipt_number'])
+        self.assertEqual(
+            AccumulationRegister.objects.get(receipt_number=result[0]['receipt_number']).amount_record,
+            Decimal('1.00'),
+        )
+
+    def test_add_fills_receipt_serial(self):
+        result = RegisterAdd(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('1.00')),
+                ]),
+            ],
+        ).add()
+        receipt_number_entity = ReceiptNumberEntity(receipt_number=result[0]['receipt_number'])
+        accumulation_register = receipt_number_entity.accumulation_register
+        self.assertIsNotNone(accumulation_register)
+        self.assertEqual(accumulation_register.receipt_number, receipt_number_entity.number)
+        self.assertEqual(accumulation_register.receipt_serial, receipt_number_entity.paid_id)
+        self.assertEqual(accumulation_register.instance_id, receipt_number_entity.instance_id)
+
+    def test_add_keeps_forced_receipt_serial(self):
+        # Порядковый номер, переданный вместе с номером квитанции, триггер не заменяет разбором номера
+        accumulation_register = AccumulationRegister.objects.create(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject=self.subject_accumulation.model_instance,
+            amount_record=Decimal('1.00'),
+            amount_total=Decimal('1.00'),
+            receipt_number='0001-0001-00007',
+            receipt_serial=9,
+        )
+        self.assertEqual(accumulation_register.receipt_serial, 9)
+        accumulation_register = AccumulationRegister.objects.create(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject=self.subject_accumulation.model_instance,
+            amount_record=Decimal('1.00'),
+            amount_total=Decimal('2.00'),
+            receipt_number='0001-0001-00008',
+        )
+        self.assertEqual(accumulation_register.receipt_serial, 8)
+
+    def test_add_with_receipt_number_seq_cache(self):
+        self.liability_internal_accounting.receipt_number_seq_cache = 20
+        self.liability_internal_accounting.save()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT cache_size FROM pg_sequences WHERE sequencename = %s',
+                [ReceiptNumberAllocator(instance_id=self.instance.id).get_sequence_name(
+                    self.liability_internal_accounting.id,
+                )],
+            )
+            self.assertEqual(cursor.fetchone(), (20,))
+
+        result = RegisterAdd(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('1.00')),
+                ]),
+            ],
+        ).add()
+        self.assertTrue(result[0]['success'])
+
+    def test_add_batch(self):
+        other_liability_internal_accounting = LiabilitiesTypeFactory(
+            instance=self.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        RegisterAdd(
+            user=self.user,
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([
+                    ('accumulation_section_id', self.liability_internal_accounting.id),
+                    ('increment_amount', Decimal('10.00')),
+                ]),
+            ],
+        ).add()
+        payload = [
+            OrderedDict([
+                ('accumulation_section_id', self.liability_internal_accounting.id),
+                ('increment_amount', Decimal('1.00')),
+            ]),
+            OrderedDict([
+                ('accumulation_section_id', self.liability_external_accounting.id),
+                ('increment_amount', Decimal('2.00')),
+            ]),
+            OrderedDict([
+                ('accumulation_section_id', other_liability_internal_accounting.id),
+                ('increment_amount', Decimal('3.00')),
+            ]),
+            OrderedDict([
+                ('accumulation_section_id', self.liability_internal_accounting.id),
+                ('increment_amount', Decimal('4.00')),
+            ]),
+        ]
+        self.subject_accumulation.model_instance
+
+        # Точка сохранения, номера квитанций, остатки, вставка, освобождение точки сохранения
+        # (виды обязательств - из реестра, загруженного предыдущей постановкой на учет)
+        with self.assertNumQueries(5):
+            result = RegisterAdd(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+            ).add()
+
+        accumulation_registers = list(AccumulationRegister.objects.order_by('-id')[:3])[::-1]
+        self.assertListEqual(
+            [accumulation_register.amount_total for accumulation_register in accumulation_registers],
+            [Decimal('11.00'), Decimal('3.00'), Decimal('15.00')],
+        )
+        self.assertListEqual(
+            result,
+            [
+                {
+                    'success': True,
+                    'postfix': accumulation_register.liabilities_type.postfix,
+                    'amount_record': accumulation_register.amount_record,
+                    'amount_total': accumulation_register.amount_total,
+                    'receipt_number': accumulation_register.receipt_number,
+                }
+                for accumulation_register in accumulation_registers[:1]
+            ] + [
+                {
+                    'success': False,
+                    'postfix': None,
+                    'amount_record': None,
+                    'amount_total': None,
+                    'receipt_number': None,
+                },
+            ] + [
+                {
+                    'success': True,
+                    'postfix': accumulation_register.liabilities_type.postfix,
+                    'amount_record': accumulation_register.amount_record,
+                    'amount_total': accumulation_register.amount_total,
+                    'receipt_number': accumulation_register.receipt_number,
+                }
+                for accumulation_register in accumulation_registers[1:]
+            ],
+        )
+        self.assertEqual(
+            SubjectBalance.objects.get(
+                subject=self.subject_accumulation.model_instance,
+                liabilities_type=self.liability_internal_accounting,
+            ).last_register_id,
+            accumulation_registers[2].id,
+        )
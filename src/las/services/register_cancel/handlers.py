@@ -53,9 +53,15 @@ class RegisterCancelStrategyInsideLiabilitiesType(RegisterCancelStrategyBase):
         )
         accumulation_register.pk = None
         accumulation_register.user = self.user
+        accumulation_register.instance = self.user.instance
         accumulation_register.amount_record *= -1
         accumulation_register.amount_total = last_total_amount + accumulation_register.amount_record
         accumulation_register.save()
+        subject_accumulation.set_last_total_instance_amount(
+            instance_id=self.user.instance.id,
+            liabilities_type_id=accumulation_register.liabilities_type.id,
+            amount_total=accumulation_register.amount_total,
+        )
         cancel_result = CancelResult(
             success=True,
             receipt_number=accumulation_register.receipt_number,
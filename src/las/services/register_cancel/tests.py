@@ -4,7 +4,7 @@ from decimal import Decimal
 from django.test import TestCase
 
 from las.factories import LiabilitiesTypeFactory
-from las.models import AccumulationRegister
+from las.models import AccumulationRegister, SubjectBalance
 from las.models.liabilities_type import TypeRunningChoices
 from las.services.register_cancel.handlers import RegisterCancel
 from las.services.tools.receipt_number import ReceiptNumberEntity
@@ -69,3 +69,27 @@ class RegisterCancelTestCase(TestsMixin, TestCase):
                 },
             ]
         )
+
+    def test_cancel_updates_subject_balance(self):
+        added = self.add_to_register(
+            user=self.user,
+            liabilities_type=self.liability_internal_accounting,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('1100.00'), Decimal('1200.00')]
+        )
+        subject_balance = SubjectBalance.objects.get(
+            instance=self.instance,
+            subject=self.subject_accumulation.model_instance,
+            liabilities_type=self.liability_internal_accounting,
+        )
+        self.assertEqual(subject_balance.amount_total, Decimal('2300.00'))
+
+        RegisterCancel(
+            user=self.user,
+            payload=[
+                OrderedDict([('receipt_number', ReceiptNumberEntity(receipt_number=added[0]['receipt_number']))]),
+            ],
+        ).cancel()
+        subject_balance.refresh_from_db()
+        self.assertEqual(subject_balance.amount_total, Decimal('1200.00'))
+        self.assertEqual(subject_balance.last_register_id, AccumulationRegister.objects.last().id)
@@ -60,6 +60,7 @@ class RegisterEditStrategyInsideLiabilitiesType(RegisterEditStrategyBase):
             increment_amount=editable_liability['new_amount'],
             liabilities_type=accumulation_register.liabilities_type,
             forced_receipt_number=accumulation_register.receipt_number,
+            forced_receipt_serial=accumulation_register.receipt_serial,
         )
 
         edit_result = EditResult(
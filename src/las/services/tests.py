@@ -2,13 +2,45 @@ from collections import OrderedDict
 from decimal import Decimal
 
 import mock
-from django.test import TestCase
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.exceptions import ValidationError
 
-from las.factories import LiabilitiesTypeFactory, SubjectAccumulationFactory
+from las.factories import InstanceFactory, LiabilitiesTypeFactory, SubjectAccumulationFactory
+from las.models import AccumulationRegister, LiabilitiesType, SubjectAccumulation, SubjectBalance
 from las.models.liabilities_type import TypeRunningChoices
-from las.services.las import LiabilityAccountingSystem
-from las.services.tools.receipt_number import ReceiptNumberEntity
-from las.services.tools.subject_accumulation import SubjectAccumulationManager
+from las.services.las import WRITE_MODE_ATOMIC, WRITE_MODE_OPTIMISTIC, LiabilityAccountingSystem
+from las.services.lock_metrics import optimistic_metrics
+from las.services.locks import (
+    AdvisoryLock,
+    BalanceRowLock,
+    LockStripes,
+    get_key_hash,
+    get_lock,
+    get_lock_stripes,
+    hold_locks,
+)
+from las.services.register_add.handlers import RegisterAddAtomic
+from las.services.tools.liabilities_type_registry import (
+    LiabilitiesTypeEntry,
+    LiabilitiesTypeRegistry,
+    get_liabilities_type_registry,
+)
+from las.services.tools.receipt_number import (
+    ReceiptNumberEntity,
+    ReceiptNumberResolver,
+    ReceiptNumberValidator,
+)
+from las.services.tools.receipt_number_allocator import ReceiptNumberAllocator
+from las.services.tools.receipt_number_cache import (
+    ReceiptNumberMetadata,
+    ReceiptNumberMetadataCache,
+    get_receipt_number_metadata_cache,
+)
+from las.services.tools.subject_accumulation import SubjectAccumulationEntity, SubjectAccumulationManager
+from las.services.tools.subject_id_cache import get_subject_id_cache
 from las.test_mixin import TestsMixin
 
 
@@ -179,3 +211,588 @@ class LiabilityAccountingSystemTestCase(TestsMixin, TestCase):
             ],
         )
         mock_edit.assert_called_once_with()
+
+    def test_receipt_number_resolver(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        added = self.add_to_register(
+            user=self.user,
+            liabilities_type=liabilities_type,
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('1000.00'), Decimal('2000.00'), Decimal('3000.00')],
+        )
+        receipt_numbers = [item['receipt_number'] for item in added]
+        receipt_number_resolver = ReceiptNumberResolver(receipt_numbers=receipt_numbers)
+
+        with self.assertNumQueries(2):
+            entities = [
+                receipt_number_resolver.get_entity(receipt_number=receipt_number)
+                for receipt_number in receipt_numbers
+            ]
+            for entity in entities:
+                self.assertTrue(entity.is_instance_and_liability_type_instance_the_same())
+                self.assertEqual(entity.subject_accumulation.ogrn, self.ogrn)
+                self.assertEqual(entity.accumulation_register.user, self.user)
+
+        for entity in entities:
+            self.assertEqual(entity.accumulation_register, ReceiptNumberEntity(entity.number).accumulation_register)
+        self.assertIsNot(
+            receipt_number_resolver.get_entity(receipt_number=receipt_numbers[0]).accumulation_register,
+            entities[0].accumulation_register,
+        )
+
+    def test_receipt_number_resolver_non_canonical(self):
+        added = self.add_to_register(
+            user=self.user,
+            liabilities_type=LiabilitiesTypeFactory(
+                instance=self.user.instance,
+                type_running=TypeRunningChoices.INTERNAL.value[0],
+            ),
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('1000.00')],
+        )
+        receipt_number_entity = ReceiptNumberEntity(added[0]['receipt_number'])
+        self.assertIsNotNone(receipt_number_entity.accumulation_register)
+        # Тот же номер без дополнения нулями не является номером квитанции
+        non_canonical_receipt_number = '{}-{}-{}'.format(
+            receipt_number_entity.instance_id,
+            receipt_number_entity.liability_type_id,
+            receipt_number_entity.paid_id,
+        )
+        self.assertIsNone(ReceiptNumberEntity(non_canonical_receipt_number).accumulation_register)
+        self.assertIsNone(ReceiptNumberEntity(non_canonical_receipt_number).metadata)
+        receipt_number_resolver = ReceiptNumberResolver(
+            receipt_numbers=[receipt_number_entity.number, non_canonical_receipt_number],
+        )
+        self.assertIsNotNone(
+            receipt_number_resolver.get_entity(receipt_number=receipt_number_entity.number).accumulation_register,
+        )
+        self.assertIsNone(
+            receipt_number_resolver.get_entity(receipt_number=non_canonical_receipt_number).accumulation_register,
+        )
+
+    def test_receipt_number_metadata_cache(self):
+        receipt_number_metadata_cache = ReceiptNumberMetadataCache(max_size=2)
+        metadata = ReceiptNumberMetadata(
+            instance_id=1,
+            liabilities_type_id=2,
+            liabilities_type_instance_id=1,
+            subject_id=3,
+        )
+        receipt_number_metadata_cache.set('0001-0002-00001', metadata)
+        receipt_number_metadata_cache.set('0001-0002-00002', metadata)
+        self.assertEqual(receipt_number_metadata_cache.get('0001-0002-00001'), metadata)
+        receipt_number_metadata_cache.set('0001-0002-00003', metadata)
+
+        self.assertIsNone(receipt_number_metadata_cache.get('0001-0002-00002'))
+        self.assertEqual(receipt_number_metadata_cache.get('0001-0002-00001'), metadata)
+        self.assertEqual(receipt_number_metadata_cache.get('0001-0002-00003'), metadata)
+        self.assertDictEqual(
+            receipt_number_metadata_cache.get_stats(),
+            {'size': 2, 'max_size': 2, 'hits': 3, 'shared_hits': 0, 'misses': 1},
+        )
+
+    def test_receipt_number_validator_uses_metadata_cache(self):
+        added = self.add_to_register(
+            user=self.user,
+            liabilities_type=LiabilitiesTypeFactory(
+                instance=self.user.instance,
+                type_running=TypeRunningChoices.INTERNAL.value[0],
+            ),
+            subject_accumulation=self.subject_accumulation,
+            amounts=[Decimal('1000.00')]
+        )
+        receipt_number = added[0]['receipt_number']
+        self.assertTrue(ReceiptNumberValidator(
+            receipt_number_entity=ReceiptNumberEntity(receipt_number=receipt_number),
+        ).valid(user=self.user))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(ReceiptNumberValidator(
+                receipt_number_entity=ReceiptNumberEntity(receipt_number=receipt_number),
+            ).valid(user=self.user))
+
+    def test_receipt_number_validator_other_instance_liabilities_type(self):
+        other_instance_liabilities_type = LiabilitiesTypeFactory(
+            instance=InstanceFactory(),
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        accumulation_register = AccumulationRegister.objects.create(
+            user=self.user,
+            liabilities_type=other_instance_liabilities_type,
+            subject=self.subject_accumulation.model_instance,
+            amount_record=Decimal('1000.00'),
+            amount_total=Decimal('1000.00'),
+            receipt_number=ReceiptNumberAllocator(instance_id=self.user.instance.id).format(
+                liabilities_type_id=other_instance_liabilities_type.id,
+                value=1,
+            ),
+        )
+        # Проверка выполняется и по сведениям из базы, и по сведениям из кэша
+        for _ in range(2):
+            with self.assertRaisesMessage(ValidationError, 'Вид обязательства не доступен этой инстанции'):
+                ReceiptNumberValidator(
+                    receipt_number_entity=ReceiptNumberEntity(receipt_number=accumulation_register.receipt_number),
+                ).valid(user=self.user, raise_exception=True)
+        self.assertIsNotNone(get_receipt_number_metadata_cache().get(accumulation_register.receipt_number))
+
+    def test_cancel_processes_all_subjects(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        other_subject_accumulation = SubjectAccumulationManager.transform(
+            model_instance=SubjectAccumulationFactory(),
+        )
+        for single_transaction in (True, False):
+            with self.subTest(single_transaction=single_transaction):
+                added = self.add_to_register(
+                    user=self.user,
+                    liabilities_type=liabilities_type,
+                    subject_accumulation=self.subject_accumulation,
+                    amounts=[Decimal('1000.00')],
+                )
+                other_added = self.add_to_register(
+                    user=self.user,
+                    liabilities_type=liabilities_type,
+                    subject_accumulation=other_subject_accumulation,
+                    amounts=[Decimal('2000.00')],
+                )
+                results = LiabilityAccountingSystem(
+                    user=self.user,
+                ).cancel(
+                    payload=[
+                        OrderedDict([('receipt_number', other_added[0]['receipt_number'])]),
+                        OrderedDict([('receipt_number', added[0]['receipt_number'])]),
+                    ],
+                    single_transaction=single_transaction,
+                )
+                self.assertCountEqual(
+                    [(result['receipt_number'], result['amount_record']) for result in results],
+                    [
+                        (added[0]['receipt_number'], Decimal('-1000.00')),
+                        (other_added[0]['receipt_number'], Decimal('-2000.00')),
+                    ],
+                )
+
+    @override_settings(LAS_LOCK_BACKEND='advisory')
+    def test_advisory_lock(self):
+        lock = get_lock(instance_id=self.instance.id, subject_id=self.ogrn)
+        self.assertIsInstance(lock, AdvisoryLock)
+        with lock:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid()",
+                )
+                self.assertEqual(cursor.fetchone(), (1,))
+
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        results = LiabilityAccountingSystem(
+            user=self.user,
+        ).add(
+            subject_accumulation=self.subject_accumulation,
+            payload=[OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('1.00'))])],
+        )
+        self.assertTrue(results[0]['success'])
+
+    @override_settings(LAS_LOCK_BACKEND='row')
+    def test_balance_row_lock(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        external_liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.EXTERNAL.value[0],
+        )
+        other_instance_liabilities_type = LiabilitiesTypeFactory(
+            instance=InstanceFactory(),
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        subject_id = self.subject_accumulation.model_instance.id
+        lock = get_lock(
+            instance_id=self.instance.id,
+            subject_id=self.ogrn,
+            liabilities_type_ids=[liabilities_type.id, external_liabilities_type.id, other_instance_liabilities_type.id],
+        )
+        self.assertIsInstance(lock, BalanceRowLock)
+        with lock:
+            self.assertListEqual(
+                list(SubjectBalance.objects.filter(
+                    instance=self.instance,
+                    subject_id=subject_id,
+                ).values_list('liabilities_type_id', 'amount_total')),
+                [(liabilities_type.id, Decimal('0'))],
+            )
+
+        results = LiabilityAccountingSystem(
+            user=self.user,
+        ).add(
+            subject_accumulation=self.subject_accumulation,
+            payload=[OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('1.00'))])],
+        )
+        self.assertEqual(results[0]['amount_total'], Decimal('1.00'))
+        cancel_results = LiabilityAccountingSystem(
+            user=self.user,
+        ).cancel(
+            payload=[OrderedDict([('receipt_number', results[0]['receipt_number'])])],
+        )
+        self.assertEqual(cancel_results[0]['amount_total'], Decimal('0.00'))
+
+    @override_settings(LAS_LOCK_BACKEND='advisory')
+    def test_hold_locks_takes_lock_stripes(self):
+        lock_stripes = LockStripes(count=4)
+        names = ['1_1023301286656', '1_1023301286657', '1_1023301286656']
+        stripes = lock_stripes.get(names)
+        self.assertEqual(len(stripes), len({get_key_hash(name) % 4 for name in names}))
+        self.assertListEqual(
+            [lock_stripes.locks.index(stripe) for stripe in stripes],
+            sorted({get_key_hash(name) % 4 for name in names}),
+        )
+
+        lock = get_lock(instance_id=self.instance.id, subject_id=self.ogrn)
+        stripe = get_lock_stripes().get([lock.name])[0]
+        with hold_locks(lock, get_lock(instance_id=self.instance.id, subject_id=self.ogrn)):
+            self.assertTrue(stripe.locked())
+        self.assertFalse(stripe.locked())
+
+    @override_settings(LAS_LOCK_BACKEND='advisory')
+    def test_add_lock_free_requires_row_lock_backend(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        payload = [OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('1.00'))])]
+        # Снятие с учета и корректировка под блокировкой `advisory` не упорядочены с постановкой на учет без блокировки
+        for write_mode in (WRITE_MODE_OPTIMISTIC, WRITE_MODE_ATOMIC):
+            with self.subTest(write_mode=write_mode):
+                with self.assertRaises(ImproperlyConfigured):
+                    LiabilityAccountingSystem(user=self.user).add(
+                        subject_accumulation=self.subject_accumulation,
+                        payload=payload,
+                        write_mode=write_mode,
+                    )
+        self.assertFalse(AccumulationRegister.objects.filter(liabilities_type=liabilities_type).exists())
+
+    @override_settings(LAS_LOCK_BACKEND='row')
+    def test_add_optimistic(self):
+        optimistic_metrics.reset()
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        payload = [OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('1.00'))])]
+        claim = SubjectAccumulationEntity.claim_last_total_instance_amount
+
+        results = LiabilityAccountingSystem(user=self.user).add(
+            subject_accumulation=self.subject_accumulation,
+            payload=payload,
+            write_mode=WRITE_MODE_OPTIMISTIC,
+        )
+        self.assertEqual(results[0]['amount_total'], Decimal('1.00'))
+
+        # Первая попытка конфликтует с параллельной операцией, повтор успешен
+        conflicts = iter([True])
+
+        def claim_with_conflict(*args, **kwargs):
+            if next(conflicts, False):
+                return None
+            return claim(*args, **kwargs)
+
+        with mock.patch.object(
+                SubjectAccumulationEntity,
+                'claim_last_total_instance_amount',
+                autospec=True,
+                side_effect=claim_with_conflict,
+        ):
+            results = LiabilityAccountingSystem(user=self.user).add(
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+                write_mode=WRITE_MODE_OPTIMISTIC,
+            )
+        self.assertEqual(results[0]['amount_total'], Decimal('2.00'))
+
+        with override_settings(LAS_OPTIMISTIC_MAX_RETRIES=1), mock.patch.object(
+                SubjectAccumulationEntity,
+                'claim_last_total_instance_amount',
+                return_value=None,
+        ):
+            results = LiabilityAccountingSystem(user=self.user).add(
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+                write_mode=WRITE_MODE_OPTIMISTIC,
+            )
+        self.assertEqual(results[0]['amount_total'], Decimal('3.00'))
+        self.assertDictEqual(
+            optimistic_metrics.snapshot(),
+            {'retries': {'0': 1, '1': 1}, 'conflicts': 3, 'fallbacks': 1},
+        )
+        self.assertEqual(
+            SubjectBalance.objects.get(
+                subject=self.subject_accumulation.model_instance,
+                liabilities_type=liabilities_type,
+            ).version,
+            3,
+        )
+
+    @override_settings(LAS_LOCK_BACKEND='row')
+    def test_add_optimistic_claims_in_liabilities_type_order(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        other_liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        payload = [
+            OrderedDict([('accumulation_section_id', other_liabilities_type.id), ('increment_amount', Decimal('1.00'))]),
+            OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('2.00'))]),
+            OrderedDict([('accumulation_section_id', other_liabilities_type.id), ('increment_amount', Decimal('3.00'))]),
+        ]
+        claim = SubjectAccumulationEntity.claim_last_total_instance_amount
+        claimed_liabilities_type_ids = []
+
+        def claim_and_record(subject_accumulation, instance_id, liabilities_type_id):
+            claimed_liabilities_type_ids.append(liabilities_type_id)
+            return claim(subject_accumulation, instance_id=instance_id, liabilities_type_id=liabilities_type_id)
+
+        with mock.patch.object(
+                SubjectAccumulationEntity,
+                'claim_last_total_instance_amount',
+                autospec=True,
+                side_effect=claim_and_record,
+        ):
+            results = LiabilityAccountingSystem(user=self.user).add(
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+                write_mode=WRITE_MODE_OPTIMISTIC,
+            )
+        # Каждая строка остатка закрепляется один раз, по возрастанию идентификатора вида обязательств
+        self.assertListEqual(claimed_liabilities_type_ids, [liabilities_type.id, other_liabilities_type.id])
+        self.assertListEqual(
+            [result['amount_total'] for result in results],
+            [Decimal('1.00'), Decimal('2.00'), Decimal('4.00')],
+        )
+
+    @override_settings(LAS_LOCK_BACKEND='row')
+    def test_add_atomic(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        other_liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        self.subject_accumulation.model_instance
+        get_liabilities_type_registry().get(liabilities_type.id)
+
+        # Одна запись - один запрос вставки, без транзакции
+        with self.assertNumQueries(1):
+            results = RegisterAddAtomic(
+                user=self.user,
+                subject_accumulation=self.subject_accumulation,
+                payload=[
+                    OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('1.50'))]),
+                ],
+            ).add()
+        self.assertEqual(results[0]['amount_total'], Decimal('1.50'))
+
+        results = LiabilityAccountingSystem(user=self.user).add(
+            subject_accumulation=self.subject_accumulation,
+            payload=[
+                OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('2.00'))]),
+                OrderedDict([('accumulation_section_id', other_liabilities_type.id), ('increment_amount', Decimal('3.00'))]),
+            ],
+            write_mode=WRITE_MODE_ATOMIC,
+        )
+        self.assertListEqual(
+            [result['amount_total'] for result in results],
+            [Decimal('3.50'), Decimal('3.00')],
+        )
+
+        accumulation_register = AccumulationRegister.objects.filter(liabilities_type=liabilities_type).last()
+        self.assertEqual(accumulation_register.amount_total, Decimal('3.50'))
+        self.assertEqual(accumulation_register.receipt_number, results[0]['receipt_number'])
+        self.assertIsNotNone(accumulation_register.receipt_serial)
+        balance = SubjectBalance.objects.get(
+            subject=self.subject_accumulation.model_instance,
+            liabilities_type=liabilities_type,
+        )
+        self.assertEqual(balance.amount_total, Decimal('3.50'))
+        self.assertEqual(balance.last_register_id, accumulation_register.id)
+        self.assertEqual(balance.version, 2)
+
+    @override_settings(LAS_LOCK_BACKEND='row')
+    def test_add_atomic_locks_in_liabilities_type_order(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        other_liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        acquire = BalanceRowLock.acquire
+        locked_liabilities_type_ids = []
+
+        def acquire_and_record(lock, cursor):
+            acquire(lock, cursor)
+            cursor.execute(
+                'SELECT liabilities_type_id FROM las_subjectbalance WHERE subject_id = %s ORDER BY liabilities_type_id',
+                [self.subject_accumulation.subject_id],
+            )
+            locked_liabilities_type_ids.append([row[0] for row in cursor.fetchall()])
+
+        payload = [
+            OrderedDict([('accumulation_section_id', other_liabilities_type.id), ('increment_amount', Decimal('1.00'))]),
+            OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('2.00'))]),
+        ]
+        reversed_payload = [
+            OrderedDict([('accumulation_section_id', liabilities_type.id), ('increment_amount', Decimal('3.00'))]),
+            OrderedDict([('accumulation_section_id', other_liabilities_type.id), ('increment_amount', Decimal('4.00'))]),
+        ]
+        with mock.patch.object(BalanceRowLock, 'acquire', autospec=True, side_effect=acquire_and_record):
+            results = LiabilityAccountingSystem(user=self.user).add(
+                subject_accumulation=self.subject_accumulation,
+                payload=payload,
+                write_mode=WRITE_MODE_ATOMIC,
+            )
+            reversed_results = LiabilityAccountingSystem(user=self.user).add(
+                subject_accumulation=self.subject_accumulation,
+                payload=reversed_payload,
+                write_mode=WRITE_MODE_ATOMIC,
+            )
+        # Строки остатков обоих видов обязательств создаются и блокируются до первой вставки в регистр,
+        # по возрастанию идентификатора вида обязательств независимо от порядка записей запроса
+        sorted_liabilities_type_ids = sorted([liabilities_type.id, other_liabilities_type.id])
+        self.assertListEqual(locked_liabilities_type_ids, [sorted_liabilities_type_ids, sorted_liabilities_type_ids])
+        self.assertListEqual(
+            [result['amount_total'] for result in results + reversed_results],
+            [Decimal('1.00'), Decimal('2.00'), Decimal('5.00'), Decimal('5.00')],
+        )
+
+    def test_liabilities_type_registry(self):
+        liabilities_type = LiabilitiesTypeFactory(
+            instance=self.user.instance,
+            type_running=TypeRunningChoices.INTERNAL.value[0],
+        )
+        registry = get_liabilities_type_registry()
+        registry.get(liabilities_type.id)
+
+        with self.assertNumQueries(0):
+            entries = registry.get_many([liabilities_type.id])
+        self.assertDictEqual(
+            entries,
+            {
+                liabilities_type.id: LiabilitiesTypeEntry(
+                    id=liabilities_type.id,
+                    instance_id=self.user.instance.id,
+                    postfix=liabilities_type.postfix,
+                    type_running=TypeRunningChoices.INTERNAL.value[0],
+                ),
+            },
+        )
+
+        # Вид обязательств, созданный без сброса реестра (например, в другом процессе до получения сообщения),
+        # загружается из базы при первом обращении и добавляется в реестр
+        created_liabilities_type, = LiabilitiesType.objects.bulk_create([
+            LiabilitiesTypeFactory.build(
+                instance=self.user.instance,
+                type_running=TypeRunningChoices.INTERNAL.value[0],
+            ),
+        ])
+        with self.assertNumQueries(1):
+            entries = registry.get_many([liabilities_type.id, created_liabilities_type.id])
+        self.assertSetEqual(set(entries), {liabilities_type.id, created_liabilities_type.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(registry.get(created_liabilities_type.id), entries[created_liabilities_type.id])
+
+        liabilities_type.type_running = TypeRunningChoices.EXTERNAL.value[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            liabilities_type.save()
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(registry.get(liabilities_type.id).type_running, TypeRunningChoices.EXTERNAL.value[0])
+
+        # Сброс, полученный из канала Redis от другого процесса
+        with mock.patch.object(registry, 'load_entries', wraps=registry.load_entries) as mock_load_entries:
+            registry.handle_message({'type': 'message', 'channel': registry.channel, 'data': b'invalidate'})
+            registry.get(liabilities_type.id)
+            registry.get(liabilities_type.id)
+        mock_load_entries.assert_called_once_with()
+
+        # Изменение в обход сигналов модели учитывается после истечения возраста реестра
+        LiabilitiesType.objects.filter(id=liabilities_type.id).update(type_running=TypeRunningChoices.INTERNAL.value[0])
+        self.assertEqual(registry.get(liabilities_type.id).type_running, TypeRunningChoices.EXTERNAL.value[0])
+        registry.loaded_at -= settings.LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE
+        self.assertEqual(registry.get(liabilities_type.id).type_running, TypeRunningChoices.INTERNAL.value[0])
+
+    def test_liabilities_type_registry_listener(self):
+        registry = LiabilitiesTypeRegistry()
+        registry.entries = {}
+        pubsub = mock.Mock()
+        pubsub.listen.return_value = iter([
+            {'type': 'message', 'channel': registry.channel, 'data': b'invalidate'},
+        ])
+        with mock.patch(
+                'las.services.tools.liabilities_type_registry.get_redis_connection',
+        ) as mock_get_redis_connection, mock.patch.object(
+            registry,
+            'handle_message',
+            wraps=registry.handle_message,
+        ) as mock_handle_message:
+            mock_get_redis_connection.return_value.pubsub.return_value = pubsub
+            registry.listen_once()
+        pubsub.subscribe.assert_called_once_with(registry.channel)
+        mock_handle_message.assert_called_once()
+        self.assertTrue(registry.subscribed.is_set())
+        self.assertIsNone(registry.entries)
+
+        # Переподключение с удвоением паузы; реестр при неудачных попытках не сбрасывается
+        registry.entries = {}
+        with mock.patch.object(
+                registry,
+                'listen_once',
+                side_effect=[ConnectionError(), ConnectionError(), KeyboardInterrupt()],
+        ), mock.patch.object(registry, 'sleep') as mock_sleep:
+            with self.assertRaises(KeyboardInterrupt):
+                registry.listen()
+        self.assertListEqual([call.args[0] for call in mock_sleep.call_args_list], [1, 2])
+        self.assertEqual(registry.entries, {})
+
+    def test_subject_id(self):
+        ogrn = '1027700132195'
+        entity = SubjectAccumulationManager.get_entity(external_id=ogrn, external_description='ПАО "Тест"')
+
+        # Новый субъект - один запрос вставки, идентификатор попадает в кэш после фиксации
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            subject_id = entity.subject_id
+        subject_accumulation = SubjectAccumulation.objects.get(ogrn=ogrn)
+        self.assertEqual(subject_id, subject_accumulation.id)
+        self.assertEqual(subject_accumulation.name, 'ПАО "Тест"')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                SubjectAccumulationManager.get_entity(external_id=ogrn, external_description=None).subject_id,
+                subject_id,
+            )
+
+        # Существующий субъект, отсутствующий в кэше, - один запрос, запись не дублируется
+        get_subject_id_cache().clear()
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                SubjectAccumulationManager.get_entity(external_id=ogrn, external_description=None).subject_id,
+                subject_id,
+            )
+        self.assertEqual(SubjectAccumulation.objects.filter(ogrn=ogrn).count(), 1)
+        self.assertEqual(get_subject_id_cache().get(ogrn), subject_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            subject_accumulation.delete()
+        self.assertIsNone(get_subject_id_cache().get(ogrn))
@@ -0,0 +1,116 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import List
+
+from django.db.models import DecimalField, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from las.models import (
+    AccumulationRegister,
+    BalanceCheckpoint,
+    LiabilitiesType,
+    SubjectAccumulation,
+    SubjectBalance,
+)
+
+
+class BalanceReader:
+    # Чтение остатков субъектов накопления в пределах одной инстанции
+
+    def __init__(self, instance_id: int):
+        self.instance_id = instance_id
+
+    def get_liabilities_types(self, liabilities_type_ids: List[int] | None = None):
+        liabilities_types = LiabilitiesType.objects.filter(instance_id=self.instance_id)
+        if liabilities_type_ids is not None:
+            liabilities_types = liabilities_types.filter(id__in=liabilities_type_ids)
+        return liabilities_types.order_by('id')
+
+    def as_of(
+            self,
+            subject_ogrn: str,
+            moment: datetime,
+            liabilities_type_ids: List[int] | None = None,
+    ) -> List[dict]:
+        """
+
+        :return: [
+            {
+                'accumulation_section_id': 1,
+                'postfix': '7',
+                'amount_total': Decimal('1111.11'),
+            },
+        ]
+        """
+        subject_id = SubjectAccumulation.objects.filter(
+            ogrn=subject_ogrn,
+        ).values_list('id', flat=True).first()
+        amount_total_field = DecimalField(max_digits=17, decimal_places=2)
+        # Поиск начинается от ближайшей предшествующей контрольной точки: записи регистра до неё могут быть
+        # заархивированы, и тогда остаток берётся из самой контрольной точки
+        nearest_checkpoint = BalanceCheckpoint.objects.filter(
+            instance_id=self.instance_id,
+            subject_id=subject_id,
+            liabilities_type_id=OuterRef('pk'),
+            register_created_at__lte=moment,
+        ).order_by('-register_created_at', '-last_register_id')
+        last_accumulation_register = AccumulationRegister.objects.filter(
+            subject_id=subject_id,
+            liabilities_type_id=OuterRef('pk'),
+            created_at__lte=moment,
+            id__gt=OuterRef('checkpoint_register_id'),
+        ).order_by('-created_at', '-id')
+        return list(self.get_liabilities_types(
+            liabilities_type_ids=liabilities_type_ids,
+        ).annotate(
+            checkpoint_register_id=Coalesce(
+                Subquery(nearest_checkpoint.values('last_register_id')[:1]),
+                Value(0),
+            ),
+        ).annotate(
+            accumulation_section_id=F('id'),
+            amount_total=Coalesce(
+                Subquery(last_accumulation_register.values('amount_total')[:1], output_field=amount_total_field),
+                Subquery(nearest_checkpoint.values('amount_total')[:1], output_field=amount_total_field),
+                Value(Decimal('0')),
+                output_field=amount_total_field,
+            ),
+        ).values(
+            'accumulation_section_id',
+            'postfix',
+            'amount_total',
+        ))
+
+    def current(
+            self,
+            subject_ogrns: List[str],
+            liabilities_type_ids: List[int] | None = None,
+    ) -> List[dict]:
+        """
+        Текущие остатки по множеству субъектов одним запросом к таблице остатков.
+        Субъекты без учтённых обязательств в ответ не попадают.
+
+        :return: [
+            {
+                'subject_ogrn': '1023301286656',
+                'accumulation_section_id': 1,
+                'postfix': '7',
+                'amount_total': Decimal('1111.11'),
+            },
+        ]
+        """
+        subject_balances = SubjectBalance.objects.filter(
+            instance_id=self.instance_id,
+            subject__ogrn__in=subject_ogrns,
+        )
+        if liabilities_type_ids is not None:
+            subject_balances = subject_balances.filter(liabilities_type_id__in=liabilities_type_ids)
+        return list(subject_balances.order_by(
+            'subject__ogrn',
+            'liabilities_type_id',
+        ).values(
+            'amount_total',
+            subject_ogrn=F('subject__ogrn'),
+            accumulation_section_id=F('liabilities_type_id'),
+            postfix=F('liabilities_type__postfix'),
+        ))
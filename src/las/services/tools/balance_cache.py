@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+
+class BalanceCache:
+    """
+    Кэш текущих остатков в Redis, ключ: инстанция + субъект накопления + вид обязательств.
+
+    Значение записывается только после фиксации транзакции (transaction.on_commit), а при изменении остатка
+    ключ удаляется сразу: если транзакция откатится, ключ останется пустым и будет перестроен из базы
+    при следующем чтении. Читать и перестраивать ключ допустимо только под блокировкой субъекта.
+
+    Поэтому кэш используется только с блокировкой `redis`: она снимается после выхода из транзакции, когда
+    отложенная запись уже выполнена. Блокировки `advisory` и `row` снимаются при фиксации, до transaction.on_commit:
+    запись остатка транзакции T1 может выполниться после удаления ключа транзакцией T2 и оставить в кэше
+    устаревший остаток, от которого продолжит цепочку следующая операция.
+    """
+    connection_alias = 'registration_accounting_events'
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.LAS_BALANCE_CACHE_ENABLED and settings.LAS_LOCK_BACKEND == 'redis'
+
+    @staticmethod
+    def get_key(instance_id: int, subject_id: int, liabilities_type_id: int) -> str:
+        return 'balance_{instance_id}_{subject_id}_{liabilities_type_id}'.format(
+            instance_id=instance_id,
+            subject_id=subject_id,
+            liabilities_type_id=liabilities_type_id,
+        )
+
+    @property
+    def connection(self):
+        return get_redis_connection(self.connection_alias)
+
+    def get(self, instance_id: int, subject_id: int, liabilities_type_id: int) -> Decimal | None:
+        value = self.connection.get(self.get_key(instance_id, subject_id, liabilities_type_id))
+        if value is None:
+            return None
+        return Decimal(value.decode())
+
+    def set_on_commit(self, instance_id: int, subject_id: int, liabilities_type_id: int, amount_total: Decimal):
+        key = self.get_key(instance_id, subject_id, liabilities_type_id)
+        transaction.on_commit(lambda: self.connection.set(
+            key,
+            str(amount_total),
+            ex=settings.LAS_BALANCE_CACHE_TIMEOUT,
+        ))
+
+    def invalidate(self, instance_id: int, subject_id: int, liabilities_type_id: int):
+        self.connection.delete(self.get_key(instance_id, subject_id, liabilities_type_id))
+
+    def invalidate_on_commit(self, instance_id: int, subject_id: int, liabilities_type_id: int):
+        self.invalidate(instance_id, subject_id, liabilities_type_id)
+        transaction.on_commit(lambda: self.invalidate(instance_id, subject_id, liabilities_type_id))
+
+    def write_through(self, instance_id: int, subject_id: int, liabilities_type_id: int, amount_total: Decimal):
+        self.invalidate(instance_id, subject_id, liabilities_type_id)
+        self.set_on_commit(instance_id, subject_id, liabilities_type_id, amount_total)
@@ -0,0 +1,70 @@
+from datetime import timedelta
+from typing import Iterator, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from las.models import (
+    AccumulationRegister,
+    BalanceCheckpoint,
+)
+
+
+class BalanceCheckpointManager:
+    """
+    Инкрементальное заполнение контрольных точек остатков.
+
+    Каждый проход обрабатывает окно записей регистра (watermark, watermark + batch_size] и фиксирует
+    для каждой затронутой цепочки (инстанция, субъект, вид обязательств) остаток на последней записи окна.
+    Водяной знак - максимальный last_register_id среди контрольных точек, поэтому все записи ниже него покрыты.
+    Записи моложе `lag` секунд не обрабатываются: их транзакции ещё могут быть не зафиксированы.
+    """
+    fill_sql = '''
+        INSERT INTO las_balancecheckpoint (
+            created_at, changed_at, instance_id, subject_id, liabilities_type_id,
+            last_register_id, register_created_at, amount_total
+        )
+        SELECT DISTINCT ON (r.instance_id, r.subject_id, r.liabilities_type_id)
+            %(now)s, %(now)s, r.instance_id, r.subject_id, r.liabilities_type_id,
+            r.id, r.created_at, r.amount_total
+        FROM las_accumulationregister r
+        WHERE r.id > %(start_id)s AND r.id <= %(end_id)s
+          AND r.instance_id IS NOT NULL
+        ORDER BY r.instance_id, r.subject_id, r.liabilities_type_id, r.id DESC
+        ON CONFLICT DO NOTHING
+    '''
+
+    def __init__(self, batch_size: int, lag: int):
+        self.batch_size = batch_size
+        self.lag = lag
+
+    @staticmethod
+    def get_watermark() -> int:
+        return BalanceCheckpoint.objects.aggregate(
+            watermark=Max('last_register_id'),
+        )['watermark'] or 0
+
+    def get_upper_bound(self) -> int:
+        return AccumulationRegister.objects.filter(
+            created_at__lte=timezone.now() - timedelta(seconds=self.lag),
+        ).order_by('-id').values_list('id', flat=True).first() or 0
+
+    def fill(self) -> Iterator[Tuple[int, int, int]]:
+        """
+
+        :return: итератор кортежей (start_id, end_id, число созданных контрольных точек) по проходам
+        """
+        start_id = self.get_watermark()
+        upper_bound = self.get_upper_bound()
+        while start_id < upper_bound:
+            end_id = min(start_id + self.batch_size, upper_bound)
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(self.fill_sql, {
+                    'now': timezone.now(),
+                    'start_id': start_id,
+                    'end_id': end_id,
+                })
+                created = cursor.rowcount
+            yield start_id, end_id, created
+            start_id = end_id
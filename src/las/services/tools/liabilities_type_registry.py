@@ -0,0 +1,202 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django_redis import get_redis_connection
+
+from las.models import LiabilitiesType
+
+logger = logging.getLogger('las')
+
+
+@dataclass(frozen=True)
+class LiabilitiesTypeEntry:
+    # Сведения о виде обязательств, необходимые при обработке регистра накопления
+    id: int
+    instance_id: int
+    postfix: str
+    type_running: str
+
+
+class LiabilitiesTypeRegistry:
+    """
+    Реестр видов обязательств в памяти процесса.
+
+    Виды обязательств меняются редко, а читаются при обработке каждой записи, поэтому реестр загружается
+    целиком одним запросом при первом обращении и сбрасывается сигналами модели LiabilitiesType
+    (las.signals): сразу и после фиксации транзакции. После фиксации сообщение о сбросе публикуется
+    в канал Redis, который слушают остальные процессы (workers).
+
+    Изменения в обход сигналов (QuerySet.update, bulk_create, SQL) и сообщения, пропущенные, пока канал
+    недоступен, учитываются перезагрузкой реестра старше LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE секунд.
+    """
+    connection_alias = 'redis'
+    channel = 'las_liabilities_type_registry'
+    # Пауза перед переподключением к каналу после ошибки (удваивается до reconnect_max_delay)
+    # и ожидание подписки при первом обращении, секунды
+    reconnect_delay = 1
+    reconnect_max_delay = 60
+    subscribe_timeout = 1
+    sleep = staticmethod(time.sleep)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries: Dict[int, LiabilitiesTypeEntry] | None = None
+        self.loaded_at = 0.0
+        # Увеличивается при каждом сбросе: загрузка, начатая до сброса, не сохраняется
+        self.generation = 0
+        self.listener: threading.Thread | None = None
+        self.subscribed = threading.Event()
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.LAS_LIABILITIES_TYPE_REGISTRY_ENABLED
+
+    @staticmethod
+    def load_entries(liabilities_type_ids: Iterable[int] | None = None) -> Dict[int, LiabilitiesTypeEntry]:
+        liabilities_types = LiabilitiesType.objects.all()
+        if liabilities_type_ids is not None:
+            liabilities_types = liabilities_types.filter(id__in=liabilities_type_ids)
+        return {
+            liabilities_type_id: LiabilitiesTypeEntry(
+                id=liabilities_type_id,
+                instance_id=instance_id,
+                postfix=postfix,
+                type_running=type_running,
+            )
+            for liabilities_type_id, instance_id, postfix, type_running in liabilities_types.values_list(
+                'id', 'instance_id', 'postfix', 'type_running',
+            )
+        }
+
+    def get_entries(self) -> Dict[int, LiabilitiesTypeEntry]:
+        self.start_listener()
+        now = time.monotonic()
+        with self.lock:
+            entries = self.entries
+            generation = self.generation
+            loaded_at = self.loaded_at
+        if entries is not None and now - loaded_at < settings.LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE:
+            return entries
+
+        entries = self.load_entries()
+        with self.lock:
+            if self.generation == generation:
+                self.entries = entries
+                self.loaded_at = now
+        return entries
+
+    def get(self, liabilities_type_id: int) -> Optional[LiabilitiesTypeEntry]:
+        return self.get_many([liabilities_type_id]).get(liabilities_type_id)
+
+    def get_many(self, liabilities_type_ids: Iterable[int]) -> Dict[int, LiabilitiesTypeEntry]:
+        liabilities_type_ids = set(liabilities_type_ids)
+        if not self.is_enabled():
+            return self.load_entries(liabilities_type_ids)
+        entries = self.get_entries()
+        missed_liabilities_type_ids = liabilities_type_ids - entries.keys()
+        if missed_liabilities_type_ids:
+            entries = self.load_missed_entries(entries=entries, liabilities_type_ids=missed_liabilities_type_ids)
+        return {
+            liabilities_type_id: entries[liabilities_type_id]
+            for liabilities_type_id in liabilities_type_ids
+            if liabilities_type_id in entries
+        }
+
+    def load_missed_entries(
+            self,
+            entries: Dict[int, LiabilitiesTypeEntry],
+            liabilities_type_ids: Iterable[int],
+    ) -> Dict[int, LiabilitiesTypeEntry]:
+        # Вид обязательств, созданный в другом процессе, может отсутствовать в реестре до получения сообщения
+        # о сбросе: недостающие виды обязательств загружаются из базы и добавляются в реестр
+        loaded_entries = self.load_entries(liabilities_type_ids)
+        if not loaded_entries:
+            return entries
+        merged_entries = {**entries, **loaded_entries}
+        with self.lock:
+            # Реестр, сброшенный или перезагруженный во время загрузки, не дополняется
+            if self.entries is entries:
+                self.entries = merged_entries
+        return merged_entries
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.entries = None
+            self.generation += 1
+
+    def publish(self) -> None:
+        try:
+            get_redis_connection(self.connection_alias).publish(self.channel, 'invalidate')
+        except Exception as exc:
+            logger.warning(f'Liabilities type registry invalidation was not published: `{exc!r}`.')
+
+    def invalidate_on_commit(self) -> None:
+        # Сброс до фиксации не дает текущему процессу использовать прежние значения,
+        # сброс после фиксации - сохранить значения, прочитанные параллельно до фиксации
+        self.invalidate()
+        transaction.on_commit(self.invalidate)
+        transaction.on_commit(self.publish)
+
+    def is_listening(self) -> bool:
+        # После fork поток родительского процесса в дочернем процессе не выполняется
+        return self.listener is not None and self.listener.is_alive()
+
+    def start_listener(self) -> None:
+        if self.is_listening():
+            return
+        with self.lock:
+            if self.is_listening():
+                return
+            self.subscribed.clear()
+            self.listener = threading.Thread(
+                target=self.listen,
+                name='liabilities-type-registry-listener',
+                daemon=True,
+            )
+            self.listener.start()
+        # Реестр загружается после подписки, чтобы не пропустить сброс, опубликованный во время загрузки
+        self.subscribed.wait(self.subscribe_timeout)
+
+    def handle_message(self, message: dict) -> None:
+        # Любое сообщение канала - сброс реестра
+        self.invalidate()
+
+    def listen_once(self) -> None:
+        # Подписка на канал и обработка сообщений до разрыва соединения
+        pubsub = get_redis_connection(self.connection_alias).pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+        # Сообщения, опубликованные до подписки (в том числе пока канал был недоступен), не получены
+        self.invalidate()
+        self.subscribed.set()
+        for message in pubsub.listen():
+            self.handle_message(message)
+
+    def listen(self) -> None:
+        reconnect_delay = self.reconnect_delay
+        while True:
+            try:
+                self.listen_once()
+                reconnect_delay = self.reconnect_delay
+            except Exception as exc:
+                # Реестр не сбрасывается при каждой попытке: пока канал недоступен, его устаревание
+                # ограничено LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE, а после подписки он будет сброшен
+                logger.warning(
+                    f'Liabilities type registry listener failed: `{exc!r}`. Reconnect in `{reconnect_delay}` s.',
+                )
+                self.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, self.reconnect_max_delay)
+
+
+_liabilities_type_registry: LiabilitiesTypeRegistry | None = None
+
+
+def get_liabilities_type_registry() -> LiabilitiesTypeRegistry:
+    global _liabilities_type_registry
+    if _liabilities_type_registry is None:
+        _liabilities_type_registry = LiabilitiesTypeRegistry()
+    return _liabilities_type_registry
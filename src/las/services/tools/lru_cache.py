@@ -0,0 +1,102 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from django.core.cache import caches
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса.
+
+    При включенном втором уровне промахи локального кэша проверяются в кэше `default`,
+    общем для всех процессов; значения второго уровня сериализуются методами to_shared/from_shared.
+    """
+    shared_cache_alias = 'default'
+    shared_key_prefix = None
+
+    def __init__(self, max_size: int, use_shared_cache: bool = False, shared_timeout: int | None = None):
+        self.max_size = max_size
+        self.use_shared_cache = use_shared_cache
+        self.shared_timeout = shared_timeout
+        self.data: OrderedDict[Hashable, Any] = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def is_enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get_shared_key(self, key: Hashable) -> str:
+        return f'{self.shared_key_prefix}_{key}'
+
+    def to_shared(self, value: Any) -> Any:
+        return value
+
+    def from_shared(self, value: Any) -> Any:
+        return value
+
+    def put_local(self, key: Hashable, value: Any) -> None:
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.is_enabled():
+            return None
+        with self.lock:
+            value = self.data.get(key)
+            if value is not None:
+                self.data.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.use_shared_cache:
+            value = caches[self.shared_cache_alias].get(self.get_shared_key(key))
+            if value is not None:
+                value = self.from_shared(value)
+                self.put_local(key, value)
+                with self.lock:
+                    self.shared_hits += 1
+                return value
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if not self.is_enabled():
+            return
+        self.put_local(key, value)
+        if self.use_shared_cache:
+            caches[self.shared_cache_alias].set(
+                self.get_shared_key(key),
+                self.to_shared(value),
+                timeout=self.shared_timeout,
+            )
+
+    def delete(self, key: Hashable) -> None:
+        with self.lock:
+            self.data.pop(key, None)
+        if self.use_shared_cache:
+            caches[self.shared_cache_alias].delete(self.get_shared_key(key))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.data.clear()
+            self.hits = 0
+            self.shared_hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {
+                'size': len(self.data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+            }
@@ -1,15 +1,20 @@
-from typing import Optional
+import copy
+from collections import defaultdict
+from typing import Dict, Iterable, Optional
 
+from django.db.models import Q
 from django.utils.functional import cached_property
 from django.utils.translation import gettext
 from rest_framework.exceptions import ValidationError
 
 from las.models import (
     Instance,
-    LiabilitiesType,
     User,
     AccumulationRegister, SubjectAccumulation,
 )
+from las.services.tools.liabilities_type_registry import LiabilitiesTypeEntry, get_liabilities_type_registry
+from las.services.tools.receipt_number_allocator import ReceiptNumberAllocator
+from las.services.tools.receipt_number_cache import ReceiptNumberMetadata, get_receipt_number_metadata_cache
 from las.services.tools.subject_accumulation import SubjectAccumulationManager, SubjectAccumulationEntity
 
 
@@ -47,17 +52,59 @@ class ReceiptNumberEntity:
             return NotImplemented
         return self.number == other.number
 
+    @property
+    def is_serial_lookup_exact(self) -> bool:
+        # Поиск по разобранному номеру (индекс las_accreg_receipt_idx) равносилен сравнению строк только для номера
+        # в формате триггера generate_receipt_number. Триггер усекает идентификаторы длиннее 4 символов,
+        # поэтому октет из 4 значащих цифр может быть началом более длинного идентификатора
+        return (
+            self.instance_id < 1000
+            and self.liability_type_id < 1000
+            and self.number == ReceiptNumberAllocator(instance_id=self.instance_id).format(
+                liabilities_type_id=self.liability_type_id,
+                value=self.paid_id,
+            )
+        )
+
+    def get_lookup(self) -> Q:
+        # Номер в формате триггера ищется только по разобранному номеру, остальные - сравнением строк
+        if self.is_serial_lookup_exact:
+            return Q(
+                instance_id=self.instance_id,
+                liabilities_type_id=self.liability_type_id,
+                receipt_serial=self.paid_id,
+            )
+        return Q(receipt_number=self.number)
+
+    @cached_property
+    def metadata(self) -> Optional[ReceiptNumberMetadata]:
+        # Сведения о существующей квитанции: из кэша процесса, при промахе - из записи регистра
+        receipt_number_metadata_cache = get_receipt_number_metadata_cache()
+        metadata = receipt_number_metadata_cache.get(self.number)
+        if metadata is None:
+            accumulation_register = self.accumulation_register
+            if accumulation_register is None or self.instance is None or self.liability_type is None:
+                return None
+            metadata = ReceiptNumberMetadata(
+                instance_id=self.instance.id,
+                liabilities_type_id=self.liability_type.id,
+                liabilities_type_instance_id=self.liability_type.instance_id,
+                subject_id=accumulation_register.subject_id,
+            )
+            receipt_number_metadata_cache.set(self.number, metadata)
+        return metadata
+
     @cached_property
     def instance(self) -> Optional[Instance]:
         return Instance.objects.filter(id=self.instance_id).last()
 
     @cached_property
-    def liability_type(self) -> LiabilitiesType | None:
-        return LiabilitiesType.objects.filter(id=self.liability_type_id).last()
+    def liability_type(self) -> LiabilitiesTypeEntry | None:
+        return get_liabilities_type_registry().get(self.liability_type_id)
 
     @cached_property
     def accumulation_register(self) -> Optional[AccumulationRegister]:
-        return AccumulationRegister.objects.filter(receipt_number=self.number).last()
+        return AccumulationRegister.objects.filter(self.get_lookup()).last()
 
     @cached_property
     def subject_accumulation(self) -> SubjectAccumulation:
@@ -69,9 +116,137 @@ class ReceiptNumberEntity:
             model_instance=self.subject_accumulation,
         )
 
+    def set_prefetched(
+            self,
+            instance: Optional[Instance],
+            liability_type: LiabilitiesTypeEntry | None,
+            accumulation_register: Optional[AccumulationRegister],
+    ) -> None:
+        # Заполнение cached_property данными, загруженными пакетно (ReceiptNumberResolver)
+        self.__dict__.update(
+            instance=instance,
+            liability_type=liability_type,
+            accumulation_register=accumulation_register,
+        )
+
     def is_instance_and_liability_type_instance_the_same(self):
         liability_type = self.liability_type
-        return liability_type is not None and liability_type.instance == self.instance
+        instance = self.instance
+        return liability_type is not None and instance is not None and liability_type.instance_id == instance.id
+
+
+class ReceiptNumberResolver:
+    """
+    Пакетное разрешение номеров квитанций.
+
+    Записи регистра загружаются одним запросом вместе с видом обязательств, инстанцией, субъектом и пользователем,
+    инстанции из номеров квитанций - ещё одним запросом, виды обязательств берутся из реестра процесса,
+    поэтому число запросов не зависит от количества номеров квитанций в payload.
+    """
+
+    def __init__(self, receipt_numbers: Iterable[str], metadata_only: bool = False) -> None:
+        """
+
+        :param metadata_only: требуются только сведения о квитанциях (валидация): номера, сведения о которых
+        есть в кэше, из базы не загружаются
+        """
+        self.receipt_numbers = [
+            receipt_number for receipt_number in dict.fromkeys(receipt_numbers)
+            if isinstance(receipt_number, str)
+        ]
+        self.metadata_only = metadata_only
+        self.cached_metadata: Dict[str, ReceiptNumberMetadata] = {}
+
+    @cached_property
+    def parsed(self) -> Dict[str, ReceiptNumberEntity]:
+        parsed = {}
+        receipt_number_metadata_cache = get_receipt_number_metadata_cache()
+        for receipt_number in self.receipt_numbers:
+            try:
+                receipt_number_entity = ReceiptNumberEntity(receipt_number=receipt_number)
+            except ReceiptNumberParseError:
+                continue
+            if self.metadata_only:
+                metadata = receipt_number_metadata_cache.get(receipt_number)
+                if metadata is not None:
+                    self.cached_metadata[receipt_number] = metadata
+                    continue
+            parsed[receipt_number] = receipt_number_entity
+        return parsed
+
+    @cached_property
+    def instances(self) -> Dict[int, Instance]:
+        return Instance.objects.in_bulk({entity.instance_id for entity in self.parsed.values()})
+
+    @cached_property
+    def liabilities_types(self) -> Dict[int, LiabilitiesTypeEntry]:
+        return get_liabilities_type_registry().get_many(
+            {entity.liability_type_id for entity in self.parsed.values()},
+        )
+
+    @cached_property
+    def accumulation_registers(self) -> Dict[str, AccumulationRegister]:
+        if not self.parsed:
+            return {}
+        # Номера в формате триггера ищутся по разобранному номеру (по одному условию на инстанцию и вид
+        # обязательств), остальные - сравнением строк
+        exact_numbers = {}
+        serials = defaultdict(set)
+        string_numbers = set()
+        for entity in self.parsed.values():
+            if entity.is_serial_lookup_exact:
+                exact_numbers[(entity.instance_id, entity.liability_type_id, entity.paid_id)] = entity.number
+                serials[(entity.instance_id, entity.liability_type_id)].add(entity.paid_id)
+            else:
+                string_numbers.add(entity.number)
+        lookup = Q(receipt_number__in=string_numbers)
+        for (instance_id, liabilities_type_id), receipt_serials in serials.items():
+            lookup |= Q(
+                instance_id=instance_id,
+                liabilities_type_id=liabilities_type_id,
+                receipt_serial__in=receipt_serials,
+            )
+        queryset = AccumulationRegister.objects.select_related(
+            'liabilities_type__instance',
+            'subject',
+            'user',
+        ).filter(lookup).order_by('id')
+        # Как и ReceiptNumberEntity.accumulation_register, по номеру квитанции берется последняя запись
+        accumulation_registers = {}
+        for accumulation_register in queryset:
+            receipt_number = accumulation_register.receipt_number
+            if receipt_number not in string_numbers:
+                receipt_number = exact_numbers.get(
+                    (
+                        accumulation_register.instance_id,
+                        accumulation_register.liabilities_type_id,
+                        accumulation_register.receipt_serial,
+                    ),
+                    receipt_number,
+                )
+            accumulation_registers[receipt_number] = accumulation_register
+        return accumulation_registers
+
+    def get_entity(self, receipt_number: str) -> ReceiptNumberEntity:
+        """
+        Каждый вызов возвращает новую сущность с собственной копией записи регистра:
+        обработчики снятия с учета изменяют полученную запись.
+
+        :raises ReceiptNumberParseError: номер квитанции невозможно декодировать
+        """
+        receipt_number_entity = ReceiptNumberEntity(receipt_number=receipt_number)
+        if receipt_number not in self.parsed:
+            if receipt_number in self.cached_metadata:
+                receipt_number_entity.__dict__['metadata'] = self.cached_metadata[receipt_number]
+            return receipt_number_entity
+
+        accumulation_register = self.accumulation_registers.get(receipt_number)
+        receipt_number_entity.set_prefetched(
+            instance=self.instances.get(receipt_number_entity.instance_id),
+            liability_type=self.liabilities_types.get(receipt_number_entity.liability_type_id),
+            accumulation_register=copy.copy(accumulation_register) if accumulation_register is not None else None,
+        )
+        return receipt_number_entity
 
 
 class ReceiptNumberValidator:
@@ -79,7 +254,7 @@ class ReceiptNumberValidator:
         self.receipt_number_entity = receipt_number_entity
 
     def receipt_number_exists(self, raise_exception=False) -> bool:
-        receipt_number_exists = self.receipt_number_entity.accumulation_register is not None
+        receipt_number_exists = self.receipt_number_entity.metadata is not None
         if not receipt_number_exists and raise_exception:
             raise ValidationError(
                 gettext('Записи в регистре с номером квитанции=`{receipt_number}` не существует').format(
@@ -89,8 +264,15 @@ class ReceiptNumberValidator:
         return receipt_number_exists
 
     def number_validate(self, user, raise_exception=False) -> bool:
-        user_is_related_to_the_instance = user.instance == self.receipt_number_entity.instance
-        liability_type_is_related_to_the_instance = self.receipt_number_entity.is_instance_and_liability_type_instance_the_same
+        metadata = self.receipt_number_entity.metadata
+        if metadata is not None:
+            user_is_related_to_the_instance = user.instance_id == metadata.instance_id
+            liability_type_is_related_to_the_instance = metadata.liabilities_type_instance_id == metadata.instance_id
+        else:
+            user_is_related_to_the_instance = user.instance == self.receipt_number_entity.instance
+            liability_type_is_related_to_the_instance = (
+                self.receipt_number_entity.is_instance_and_liability_type_instance_the_same()
+            )
         is_valid = all([
             user_is_related_to_the_instance,
             liability_type_is_related_to_the_instance,
@@ -0,0 +1,53 @@
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from django.db import connection
+
+
+class ReceiptNumberAllocator:
+    """
+    Резервирование значений sequence receipt_number_seq_{instance.id}_{liability_type.id} блоками (аналог hi/lo).
+
+    Значения для всех видов обязательств выделяются одним запросом, номера квитанций формируются в приложении
+    и передаются в регистр как `forced_receipt_number` вместе с порядковым номером, поэтому триггер
+    generate_receipt_number не обращается к sequence, не формирует и не разбирает строку для каждой записи.
+    Как и при выделении триггером, значения не возвращаются в sequence при откате транзакции.
+    """
+    allocate_sql = 'SELECT %s, NEXTVAL(%s) FROM generate_series(1, %s)'
+
+    def __init__(self, instance_id: int):
+        self.instance_id = instance_id
+
+    def get_sequence_name(self, liabilities_type_id: int) -> str:
+        return f'receipt_number_seq_{self.instance_id}_{liabilities_type_id}'
+
+    def format(self, liabilities_type_id: int, value: int) -> str:
+        # Повторяет форматирование триггера generate_receipt_number: lpad дополняет нулями
+        # и усекает строку до заданной длины, порядковый номер - не короче 5 символов
+        return '{instance_id}-{liabilities_type_id}-{value}'.format(
+            instance_id=str(self.instance_id).rjust(4, '0')[:4],
+            liabilities_type_id=str(liabilities_type_id).rjust(4, '0')[:4],
+            value=str(value).rjust(5, '0'),
+        )
+
+    def allocate(self, counts: Dict[int, int]) -> Dict[int, List[Tuple[str, int]]]:
+        """
+
+        :param counts: {идентификатор вида обязательств: количество требуемых номеров квитанций}
+        :return: {идентификатор вида обязательств: [(номер квитанции, порядковый номер) в порядке возрастания]}
+        """
+        counts = {liabilities_type_id: count for liabilities_type_id, count in counts.items() if count > 0}
+        if not counts:
+            return {}
+
+        params = []
+        for liabilities_type_id, count in sorted(counts.items()):
+            params.extend([liabilities_type_id, self.get_sequence_name(liabilities_type_id), count])
+        with connection.cursor() as cursor:
+            cursor.execute(' UNION ALL '.join([self.allocate_sql] * len(counts)), params)
+            rows = cursor.fetchall()
+
+        receipt_numbers = defaultdict(list)
+        for liabilities_type_id, value in sorted(rows):
+            receipt_numbers[liabilities_type_id].append((self.format(liabilities_type_id, value), value))
+        return dict(receipt_numbers)
@@ -0,0 +1,44 @@
+from dataclasses import astuple, dataclass
+
+from django.conf import settings
+
+from las.services.tools.lru_cache import LRUCache
+
+
+@dataclass(frozen=True)
+class ReceiptNumberMetadata:
+    # Неизменяемые сведения о квитанции: инстанция, вид обязательств и субъект накопления не меняются
+    # при снятии с учета и корректировке
+    instance_id: int
+    liabilities_type_id: int
+    liabilities_type_instance_id: int
+    subject_id: int
+
+
+class ReceiptNumberMetadataCache(LRUCache):
+    """
+    LRU-кэш сведений о квитанциях в памяти процесса.
+
+    Ключ - номер квитанции в том виде, в котором он найден в регистре накопления.
+    """
+    shared_key_prefix = 'las_receipt_number'
+
+    def to_shared(self, metadata: ReceiptNumberMetadata) -> tuple:
+        return astuple(metadata)
+
+    def from_shared(self, value: tuple) -> ReceiptNumberMetadata:
+        return ReceiptNumberMetadata(*value)
+
+
+_receipt_number_metadata_cache: ReceiptNumberMetadataCache | None = None
+
+
+def get_receipt_number_metadata_cache() -> ReceiptNumberMetadataCache:
+    global _receipt_number_metadata_cache
+    if _receipt_number_metadata_cache is None:
+        _receipt_number_metadata_cache = ReceiptNumberMetadataCache(
+            max_size=settings.LAS_RECEIPT_NUMBER_CACHE_SIZE,
+            use_shared_cache=settings.LAS_RECEIPT_NUMBER_CACHE_SHARED,
+            shared_timeout=settings.LAS_RECEIPT_NUMBER_CACHE_TIMEOUT,
+        )
+    return _receipt_number_metadata_cache
@@ -0,0 +1,272 @@
+import multiprocessing
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from decimal import Decimal
+from typing import Iterator, List, Tuple
+
+from django.db import connection, connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from las.models import (
+    ReconciliationAudit,
+    ReconciliationWatermark,
+    SubjectAccumulation,
+)
+
+# Проверка цепочек остатков: amount_total каждой записи должен быть равен amount_total предыдущей записи
+# той же цепочки (инстанция, субъект, вид обязательств) плюс amount_record. Первая запись цепочки сверяется
+# с последней контрольной точкой до нее (записи до контрольной точки могут быть заархивированы)
+CHAIN_MISMATCH_SQL = '''
+    SELECT id, instance_id, subject_id, liabilities_type_id, amount_record, amount_total, expected_amount_total
+    FROM (
+        SELECT r.id, r.instance_id, r.subject_id, r.liabilities_type_id, r.amount_record, r.amount_total,
+               COALESCE(
+                   lag(r.amount_total) OVER chain,
+                   (
+                       SELECT cp.amount_total FROM las_balancecheckpoint cp
+                       WHERE cp.instance_id = r.instance_id AND cp.subject_id = r.subject_id
+                         AND cp.liabilities_type_id = r.liabilities_type_id AND cp.last_register_id < r.id
+                       ORDER BY cp.last_register_id DESC LIMIT 1
+                   ),
+                   0
+               ) + r.amount_record AS expected_amount_total
+        FROM las_accumulationregister r
+        WHERE r.subject_id >= %(subject_id_from)s AND r.subject_id < %(subject_id_to)s
+        WINDOW chain AS (PARTITION BY r.instance_id, r.subject_id, r.liabilities_type_id ORDER BY r.id)
+    ) chain
+    WHERE amount_total <> expected_amount_total
+    ORDER BY id
+'''
+
+# Инкрементальная проверка: только цепочки, затронутые записями окна (register_id_from, register_id_to]
+# всех инстанций, включая записи без инстанции. Первая запись цепочки в окне сверяется с последним проверенным
+# остатком цепочки - записью регистра до начала окна, а если она заархивирована - с контрольной точкой
+INCREMENTAL_CHAIN_MISMATCH_SQL = '''
+    WITH touched AS (
+        SELECT r.id, r.instance_id, r.subject_id, r.liabilities_type_id, r.amount_record, r.amount_total
+        FROM las_accumulationregister r
+        WHERE r.id > %(register_id_from)s AND r.id <= %(register_id_to)s
+    ),
+    verified AS (
+        SELECT c.instance_id, c.subject_id, c.liabilities_type_id, COALESCE(
+            (
+                SELECT p.amount_total FROM las_accumulationregister p
+                WHERE p.instance_id = c.instance_id AND p.subject_id = c.subject_id
+                  AND p.liabilities_type_id = c.liabilities_type_id AND p.id <= %(register_id_from)s
+                ORDER BY p.id DESC LIMIT 1
+            ),
+            (
+                SELECT p.amount_total FROM las_accumulationregister p
+                WHERE c.instance_id IS NULL AND p.instance_id IS NULL AND p.subject_id = c.subject_id
+                  AND p.liabilities_type_id = c.liabilities_type_id AND p.id <= %(register_id_from)s
+                ORDER BY p.id DESC LIMIT 1
+            ),
+            (
+                SELECT cp.amount_total FROM las_balancecheckpoint cp
+                WHERE cp.instance_id = c.instance_id AND cp.subject_id = c.subject_id
+                  AND cp.liabilities_type_id = c.liabilities_type_id AND cp.last_register_id <= %(register_id_from)s
+                ORDER BY cp.last_register_id DESC LIMIT 1
+            ),
+            0
+        ) AS amount_total
+        FROM (SELECT DISTINCT instance_id, subject_id, liabilities_type_id FROM touched) c
+    )
+    SELECT id, instance_id, subject_id, liabilities_type_id, amount_record, amount_total, expected_amount_total
+    FROM (
+        SELECT t.id, t.instance_id, t.subject_id, t.liabilities_type_id, t.amount_record, t.amount_total,
+               COALESCE(lag(t.amount_total) OVER chain, v.amount_total) + t.amount_record AS expected_amount_total
+        FROM touched t
+        JOIN verified v ON v.instance_id IS NOT DISTINCT FROM t.instance_id
+                       AND v.subject_id = t.subject_id AND v.liabilities_type_id = t.liabilities_type_id
+        WINDOW chain AS (PARTITION BY t.instance_id, t.subject_id, t.liabilities_type_id ORDER BY t.id)
+    ) chain
+    WHERE amount_total <> expected_amount_total
+    ORDER BY id
+'''
+
+INCREMENTAL_CHAIN_COUNT_SQL = '''
+    SELECT r.instance_id, count(*), count(DISTINCT (r.subject_id, r.liabilities_type_id))
+    FROM las_accumulationregister r
+    WHERE r.id > %(register_id_from)s AND r.id <= %(register_id_to)s
+    GROUP BY r.instance_id
+    ORDER BY r.instance_id NULLS LAST
+'''
+
+# Граница сверки: снимок транзакций и последняя запись регистра, видимая в этом снимке (одним оператором)
+RECONCILIATION_FENCE_SQL = '''
+    SELECT pg_current_snapshot()::text, (SELECT max(id) FROM las_accumulationregister)
+'''
+
+# Граница пройдена, если завершились все транзакции, выполнявшиеся на момент снимка
+RECONCILIATION_FENCE_PASSED_SQL = '''
+    SELECT NOT EXISTS (
+        SELECT 1 FROM pg_snapshot_xip(%(snapshot)s::pg_snapshot) xip
+        WHERE pg_xact_status(xip) = 'in progress'
+    )
+'''
+
+
+@dataclass
+class ChainMismatch:
+    register_id: int
+    instance_id: int
+    subject_id: int
+    liabilities_type_id: int
+    amount_record: Decimal
+    amount_total: Decimal
+    expected_amount_total: Decimal
+
+
+def reconcile_subject_range(subject_id_range: Tuple[int, int]) -> List[ChainMismatch]:
+    subject_id_from, subject_id_to = subject_id_range
+    with connection.cursor() as cursor:
+        cursor.execute(CHAIN_MISMATCH_SQL, {
+            'subject_id_from': subject_id_from,
+            'subject_id_to': subject_id_to,
+        })
+        return [ChainMismatch(*row) for row in cursor.fetchall()]
+
+
+class ChainReconciler:
+    """
+    Полная сверка цепочек остатков регистра накопления.
+
+    Пространство ключей делится на диапазоны идентификаторов субъектов накопления (цепочка целиком попадает
+    в один диапазон), диапазоны проверяются пулом процессов, расхождения отдаются по мере готовности диапазонов.
+    """
+
+    def __init__(self, workers: int, chunk_size: int):
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def get_subject_id_ranges(self) -> List[Tuple[int, int]]:
+        bounds = SubjectAccumulation.objects.aggregate(
+            subject_id_min=Min('id'),
+            subject_id_max=Max('id'),
+        )
+        if bounds['subject_id_min'] is None:
+            return []
+        return [
+            (subject_id_from, subject_id_from + self.chunk_size)
+            for subject_id_from in range(bounds['subject_id_min'], bounds['subject_id_max'] + 1, self.chunk_size)
+        ]
+
+    def reconcile(self) -> Iterator[ChainMismatch]:
+        subject_id_ranges = self.get_subject_id_ranges()
+        if self.workers <= 1:
+            for subject_id_range in subject_id_ranges:
+                yield from reconcile_subject_range(subject_id_range)
+            return
+
+        # Дочерние процессы не должны наследовать открытое соединение с базой
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(processes=self.workers) as pool:
+            for mismatches in pool.imap_unordered(reconcile_subject_range, subject_id_ranges):
+                yield from mismatches
+
+
+class IncrementalChainReconciler:
+    """
+    Инкрементальная сверка цепочек остатков по водяному знаку (последней сверенной записи регистра).
+
+    Новые записи всех инстанций проходятся один раз окнами по `batch_size` идентификаторов, окно проверяется
+    двумя запросами с группировкой по инстанции, поэтому стоимость прохода пропорциональна числу новых записей.
+    Результаты пишутся в ReconciliationAudit (по одному на инстанцию окна), водяной знак сдвигается
+    в той же транзакции.
+
+    Идентификаторы выделяются до фиксации, поэтому запись с меньшим идентификатором может стать видимой позже
+    записи с большим. Верхняя граница сверки - последняя видимая запись на момент снимка транзакций; записи
+    до нее сверяются только после завершения всех транзакций, выполнявшихся в момент снимка. Если такие
+    транзакции есть, граница сохраняется в водяном знаке и используется следующим запуском.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+
+    @staticmethod
+    def get_fence() -> Tuple[str, int]:
+        with connection.cursor() as cursor:
+            cursor.execute(RECONCILIATION_FENCE_SQL)
+            snapshot, register_id = cursor.fetchone()
+        return snapshot, register_id or 0
+
+    @staticmethod
+    def is_fence_passed(snapshot: str) -> bool:
+        with connection.cursor() as cursor:
+            cursor.execute(RECONCILIATION_FENCE_PASSED_SQL, {'snapshot': snapshot})
+            return cursor.fetchone()[0]
+
+    def get_upper_bound(self, watermark: ReconciliationWatermark) -> int:
+        snapshot, register_id = self.get_fence()
+        if self.is_fence_passed(snapshot):
+            upper_bound = register_id
+            snapshot, register_id = None, None
+        elif watermark.fence_snapshot is not None and self.is_fence_passed(watermark.fence_snapshot):
+            upper_bound = watermark.fence_register_id
+        elif watermark.fence_snapshot is not None:
+            # Прежняя граница ещё не пройдена: она не заменяется, иначе при постоянной нагрузке сверка не продвинется
+            return watermark.last_register_id
+        else:
+            upper_bound = watermark.last_register_id
+
+        ReconciliationWatermark.objects.filter(
+            id=watermark.id,
+        ).update(
+            fence_snapshot=snapshot,
+            fence_register_id=register_id,
+            changed_at=timezone.now(),
+        )
+        return max(upper_bound, watermark.last_register_id)
+
+    @staticmethod
+    def reconcile_window(register_id_from: int, register_id_to: int) -> List[ReconciliationAudit]:
+        params = {
+            'register_id_from': register_id_from,
+            'register_id_to': register_id_to,
+        }
+        with connection.cursor() as cursor:
+            cursor.execute(INCREMENTAL_CHAIN_COUNT_SQL, params)
+            counts = cursor.fetchall()
+            if not counts:
+                return []
+            cursor.execute(INCREMENTAL_CHAIN_MISMATCH_SQL, params)
+            mismatches = [ChainMismatch(*row) for row in cursor.fetchall()]
+
+        instance_mismatches = defaultdict(list)
+        for mismatch in mismatches:
+            instance_mismatches[mismatch.instance_id].append(asdict(mismatch))
+        return [
+            ReconciliationAudit.objects.create(
+                instance_id=instance_id,
+                register_id_from=register_id_from,
+                register_id_to=register_id_to,
+                chains_checked=chains_checked,
+                rows_checked=rows_checked,
+                mismatches_count=len(instance_mismatches[instance_id]),
+                mismatches=instance_mismatches[instance_id],
+            )
+            for instance_id, rows_checked, chains_checked in counts
+        ]
+
+    def reconcile(self) -> Iterator[ReconciliationAudit]:
+        watermark = ReconciliationWatermark.objects.order_by('id').first()
+        if watermark is None:
+            watermark = ReconciliationWatermark.objects.create()
+        upper_bound = self.get_upper_bound(watermark)
+        register_id_from = watermark.last_register_id
+        while register_id_from < upper_bound:
+            register_id_to = min(register_id_from + self.batch_size, upper_bound)
+            with transaction.atomic():
+                audits = self.reconcile_window(
+                    register_id_from=register_id_from,
+                    register_id_to=register_id_to,
+                )
+                ReconciliationWatermark.objects.filter(
+                    id=watermark.id,
+                ).update(
+                    last_register_id=register_id_to,
+                    changed_at=timezone.now(),
+                )
+            yield from audits
+            register_id_from = register_id_to
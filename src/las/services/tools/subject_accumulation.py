@@ -1,11 +1,18 @@
 from dataclasses import dataclass
 from decimal import Decimal
 from functools import cached_property
+from typing import Dict, Iterable
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
 
 from las.models import (
     SubjectAccumulation,
-    AccumulationRegister,
+    SubjectBalance,
 )
+from las.services.tools.balance_cache import BalanceCache
+from las.services.tools.subject_id_cache import get_subject_id_cache
 
 
 @dataclass
@@ -13,34 +20,205 @@ class SubjectAccumulationEntity:
     external_id: str
     external_description: str
 
+    # Вставка субъекта накопления или, если субъект с таким ОГРН уже есть, чтение его идентификатора одним запросом.
+    # Обе части запроса видят один снимок данных: если субъекта вставила параллельная транзакция,
+    # зафиксированная после начала запроса, строка не возвращается и идентификатор читается повторно
+    subject_id_sql = '''
+        WITH inserted AS (
+            INSERT INTO las_subjectaccumulation (created_at, changed_at, ogrn, name)
+            VALUES (%(now)s, %(now)s, %(ogrn)s, %(name)s)
+            ON CONFLICT (ogrn) DO NOTHING
+            RETURNING id
+        )
+        SELECT id FROM inserted
+        UNION ALL
+        SELECT id FROM las_subjectaccumulation WHERE ogrn = %(ogrn)s
+        LIMIT 1
+    '''
+
     @cached_property
-    def model_instance(self) -> SubjectAccumulation:
-        subject_accumulation, _ = SubjectAccumulation.objects.get_or_create(
-            ogrn=self.external_id,
-            defaults={
+    def subject_id(self) -> int:
+        # Идентификатор субъекта накопления: из кэша (ОГРН -> идентификатор), при промахе - из базы;
+        # отсутствующий субъект создается
+        subject_id_cache = get_subject_id_cache()
+        subject_id = subject_id_cache.get(self.external_id)
+        if subject_id is not None:
+            return subject_id
+
+        with connection.cursor() as cursor:
+            cursor.execute(self.subject_id_sql, {
+                'now': timezone.now(),
+                'ogrn': self.external_id,
                 'name': self.external_description,
-            },
-        )
-        return subject_accumulation
+            })
+            row = cursor.fetchone()
+        if row is not None:
+            subject_id = row[0]
+        else:
+            subject_id = SubjectAccumulation.objects.values_list('id', flat=True).get(ogrn=self.external_id)
+        # Субъект, вставленный в незафиксированной транзакции, попадает в кэш только после фиксации
+        transaction.on_commit(lambda: subject_id_cache.set(self.external_id, subject_id))
+        return subject_id
+
+    def ensure_created(self) -> int:
+        # Создание отсутствующего субъекта накопления до операций, которым нужна его строка (например, блокировки `row`)
+        return self.subject_id
+
+    @cached_property
+    def model_instance(self) -> SubjectAccumulation:
+        return SubjectAccumulation.objects.get(id=self.subject_id)
 
     def get_last_total_instance_amount(
             self,
             instance_id: int,
             liabilities_type_id: int,
     ) -> Decimal:
-        accumulation_register = AccumulationRegister.objects.filter(
-            user__instance_id=instance_id,
-            subject_id=self.model_instance,
+        balance_cache = BalanceCache()
+        if balance_cache.is_enabled():
+            amount_total = balance_cache.get(
+                instance_id=instance_id,
+                subject_id=self.subject_id,
+                liabilities_type_id=liabilities_type_id,
+            )
+            if amount_total is not None:
+                return amount_total
+
+        amount_total = SubjectBalance.objects.filter(
+            instance_id=instance_id,
+            subject_id=self.subject_id,
             liabilities_type_id=liabilities_type_id,
-        ).last()
-        if accumulation_register is not None:
-            return accumulation_register.amount_total
-        return Decimal('0')
+        ).values_list('amount_total', flat=True).first()
+        if amount_total is None:
+            amount_total = Decimal('0')
+
+        if balance_cache.is_enabled():
+            balance_cache.set_on_commit(
+                instance_id=instance_id,
+                subject_id=self.subject_id,
+                liabilities_type_id=liabilities_type_id,
+                amount_total=amount_total,
+            )
+        return amount_total
+
+    def get_last_total_instance_amounts(
+            self,
+            instance_id: int,
+            liabilities_type_ids: Iterable[int],
+    ) -> Dict[int, Decimal]:
+        # Остатки по нескольким видам обязательств: промахи кэша читаются из базы одним запросом
+        balance_cache = BalanceCache()
+        amount_totals = {}
+        missed_liabilities_type_ids = set(liabilities_type_ids)
+        if balance_cache.is_enabled():
+            for liabilities_type_id in list(missed_liabilities_type_ids):
+                amount_total = balance_cache.get(
+                    instance_id=instance_id,
+                    subject_id=self.subject_id,
+                    liabilities_type_id=liabilities_type_id,
+                )
+                if amount_total is not None:
+                    amount_totals[liabilities_type_id] = amount_total
+                    missed_liabilities_type_ids.discard(liabilities_type_id)
+        if not missed_liabilities_type_ids:
+            return amount_totals
+
+        loaded_amount_totals = dict(SubjectBalance.objects.filter(
+            instance_id=instance_id,
+            subject_id=self.subject_id,
+            liabilities_type_id__in=missed_liabilities_type_ids,
+        ).values_list('liabilities_type_id', 'amount_total'))
+        for liabilities_type_id in missed_liabilities_type_ids:
+            amount_total = loaded_amount_totals.get(liabilities_type_id, Decimal('0'))
+            amount_totals[liabilities_type_id] = amount_total
+            if balance_cache.is_enabled():
+                balance_cache.set_on_commit(
+                    instance_id=instance_id,
+                    subject_id=self.subject_id,
+                    liabilities_type_id=liabilities_type_id,
+                    amount_total=amount_total,
+                )
+        return amount_totals
+
+    def set_last_total_instance_amount(
+            self,
+            instance_id: int,
+            liabilities_type_id: int,
+            amount_total: Decimal,
+    ):
+        # Строку остатка в базе обновляет триггер, здесь поддерживается только кэш
+        balance_cache = BalanceCache()
+        if balance_cache.is_enabled():
+            balance_cache.write_through(
+                instance_id=instance_id,
+                subject_id=self.subject_id,
+                liabilities_type_id=liabilities_type_id,
+                amount_total=amount_total,
+            )
+
+    def claim_last_total_instance_amount(
+            self,
+            instance_id: int,
+            liabilities_type_id: int,
+    ) -> Decimal | None:
+        """
+        Чтение остатка с проверкой версии строки остатка (оптимистичная запись, без кэша).
+
+        Условное обновление по прочитанной версии удерживает строку до конца транзакции:
+        параллельная операция дождется фиксации и увидит новую версию.
+        :return: остаток или None, если строку изменила параллельная операция
+        """
+        balance = SubjectBalance.objects.filter(
+            instance_id=instance_id,
+            subject_id=self.subject_id,
+            liabilities_type_id=liabilities_type_id,
+        ).values_list('id', 'amount_total', 'version').first()
+        if balance is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    '''
+                    INSERT INTO las_subjectbalance (
+                        created_at, changed_at, instance_id, subject_id, liabilities_type_id,
+                        amount_total, last_register_id, version
+                    )
+                    VALUES (now(), now(), %s, %s, %s, 0, NULL, 0)
+                    ON CONFLICT (instance_id, subject_id, liabilities_type_id) DO NOTHING
+                    RETURNING id
+                    ''',
+                    [instance_id, self.subject_id, liabilities_type_id],
+                )
+                if cursor.fetchone() is None:
+                    return None
+            return Decimal('0')
+
+        balance_id, amount_total, version = balance
+        claimed = SubjectBalance.objects.filter(
+            id=balance_id,
+            version=version,
+        ).update(
+            version=F('version'),
+        )
+        if not claimed:
+            return None
+        return amount_total
+
+    def invalidate_last_total_instance_amount(
+            self,
+            instance_id: int,
+            liabilities_type_id: int,
+    ):
+        # Запись без блокировки субъекта: значение в кэш не записывается, а удаляется сразу и после фиксации
+        balance_cache = BalanceCache()
+        if balance_cache.is_enabled():
+            balance_cache.invalidate_on_commit(
+                instance_id=instance_id,
+                subject_id=self.subject_id,
+                liabilities_type_id=liabilities_type_id,
+            )
 
     def log_representation(self):
         return 'external_id=`%s` (model_instance_id=`%s`)' % (
             self.external_id,
-            self.model_instance.id,
+            self.subject_id,
         )
 
 
@@ -54,7 +232,13 @@ class SubjectAccumulationManager:
 
     @staticmethod
     def transform(model_instance: SubjectAccumulation) -> SubjectAccumulationEntity:
-        return SubjectAccumulationManager.get_entity(
+        subject_accumulation = SubjectAccumulationManager.get_entity(
             external_id=model_instance.ogrn,
             external_description=model_instance.name,
         )
+        # Запись уже загружена, повторное чтение идентификатора не требуется
+        subject_accumulation.__dict__.update(
+            subject_id=model_instance.id,
+            model_instance=model_instance,
+        )
+        return subject_accumulation
@@ -0,0 +1,26 @@
+from django.conf import settings
+
+from las.services.tools.lru_cache import LRUCache
+
+
+class SubjectIdCache(LRUCache):
+    """
+    LRU-кэш идентификаторов субъектов накопления в памяти процесса.
+
+    Ключ - ОГРН (ОГРНИП) субъекта накопления: идентификатор записи субъекта не меняется.
+    """
+    shared_key_prefix = 'las_subject_id'
+
+
+_subject_id_cache: SubjectIdCache | None = None
+
+
+def get_subject_id_cache() -> SubjectIdCache:
+    global _subject_id_cache
+    if _subject_id_cache is None:
+        _subject_id_cache = SubjectIdCache(
+            max_size=settings.LAS_SUBJECT_ID_CACHE_SIZE,
+            use_shared_cache=settings.LAS_SUBJECT_ID_CACHE_SHARED,
+            shared_timeout=settings.LAS_SUBJECT_ID_CACHE_TIMEOUT,
+        )
+    return _subject_id_cache
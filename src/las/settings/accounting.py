@@ -0,0 +1,58 @@
+from .common import env
+
+# Кэш текущих остатков в Redis (`registration_accounting_events`), используется только с LAS_LOCK_BACKEND = `redis`
+LAS_BALANCE_CACHE_ENABLED = env.bool('LAS_BALANCE_CACHE_ENABLED', default=False)
+LAS_BALANCE_CACHE_TIMEOUT = env.int('LAS_BALANCE_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# Максимальное число субъектов в одном запросе текущих остатков
+LAS_BALANCE_BULK_MAX_SUBJECTS = env.int('LAS_BALANCE_BULK_MAX_SUBJECTS', default=50000)
+
+# Контрольные точки остатков (manage.py las_checkpoint_balances): число записей регистра за один проход
+# и отставание от текущего момента, за которое транзакции гарантированно завершены
+LAS_BALANCE_CHECKPOINT_BATCH_SIZE = env.int('LAS_BALANCE_CHECKPOINT_BATCH_SIZE', default=100000)
+LAS_BALANCE_CHECKPOINT_LAG = env.int('LAS_BALANCE_CHECKPOINT_LAG', default=60)
+
+# Инкрементальная сверка цепочек остатков (manage.py las_reconcile --incremental): число записей регистра
+# за один проход. Верхняя граница определяется по снимку транзакций, а не по отставанию от текущего момента
+LAS_RECONCILIATION_BATCH_SIZE = env.int('LAS_RECONCILIATION_BATCH_SIZE', default=100000)
+
+# LRU-кэш сведений о квитанциях в памяти процесса (0 - отключен)
+# и второй уровень кэша в `default` (memcached), общий для всех процессов
+LAS_RECEIPT_NUMBER_CACHE_SIZE = env.int('LAS_RECEIPT_NUMBER_CACHE_SIZE', default=10000)
+LAS_RECEIPT_NUMBER_CACHE_SHARED = env.bool('LAS_RECEIPT_NUMBER_CACHE_SHARED', default=False)
+LAS_RECEIPT_NUMBER_CACHE_TIMEOUT = env.int('LAS_RECEIPT_NUMBER_CACHE_TIMEOUT', default=60 * 60 * 24)
+
+# Блокировка субъекта накопления на время операции: `redis` (redis_lock), `advisory` (pg_advisory_xact_lock)
+# или `row` (SELECT ... FOR UPDATE строк остатков по видам обязательств субъекта)
+LAS_LOCK_BACKEND = env.str('LAS_LOCK_BACKEND', default='redis')
+
+# Метрики блокировок: ожидание, начиная с которого захват блокировки логируется как медленный,
+# и ожидание, начиная с которого ключ считается конкурентным (окно, секунды, и размер рейтинга ключей)
+LAS_LOCK_SLOW_ACQUIRE = env.float('LAS_LOCK_SLOW_ACQUIRE', default=1.0)
+LAS_LOCK_CONTENDED_WAIT = env.float('LAS_LOCK_CONTENDED_WAIT', default=0.01)
+LAS_LOCK_CONTENDED_WINDOW = env.int('LAS_LOCK_CONTENDED_WINDOW', default=300)
+LAS_LOCK_CONTENDED_TOP = env.int('LAS_LOCK_CONTENDED_TOP', default=10)
+
+# Число локальных блокировок процесса (полос), которые берутся перед блокировкой субъекта (0 - не используются)
+LAS_LOCK_STRIPES = env.int('LAS_LOCK_STRIPES', default=64)
+
+# Режим постановки на учет: `lock` - под блокировкой субъекта, `optimistic` - без блокировки с проверкой версии остатка
+# и повтором при конфликте (после LAS_OPTIMISTIC_MAX_RETRIES повторов остаток вычисляется в базе под блокировкой;
+# закрепленная строка остатка блокирует параллельные операции по ключу до фиксации, поэтому режим подходит
+# для ключей с редкими конфликтами), `atomic` - без блокировки,
+# остаток вычисляется в базе одним запросом. Снятие с учета и корректировка выполняются под блокировкой субъекта;
+# режимы без блокировки требуют LAS_LOCK_BACKEND = `row` (блокируются те же строки остатков), иначе ImproperlyConfigured
+LAS_WRITE_MODE = env.str('LAS_WRITE_MODE', default='lock')
+LAS_OPTIMISTIC_MAX_RETRIES = env.int('LAS_OPTIMISTIC_MAX_RETRIES', default=3)
+
+# Реестр видов обязательств в памяти процесса, сбрасывается сигналами модели и сообщениями в канале Redis
+LAS_LIABILITIES_TYPE_REGISTRY_ENABLED = env.bool('LAS_LIABILITIES_TYPE_REGISTRY_ENABLED', default=True)
+# Возраст реестра (секунды), после которого он перезагружается: изменения в обход сигналов модели
+# и сбросы, пропущенные при недоступности канала Redis
+LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE = env.int('LAS_LIABILITIES_TYPE_REGISTRY_MAX_AGE', default=300)
+
+# LRU-кэш идентификаторов субъектов накопления по ОГРН в памяти процесса (0 - отключен)
+# и второй уровень кэша в `default` (memcached), общий для всех процессов
+LAS_SUBJECT_ID_CACHE_SIZE = env.int('LAS_SUBJECT_ID_CACHE_SIZE', default=100000)
+LAS_SUBJECT_ID_CACHE_SHARED = env.bool('LAS_SUBJECT_ID_CACHE_SHARED', default=False)
+LAS_SUBJECT_ID_CACHE_TIMEOUT = env.int('LAS_SUBJECT_ID_CACHE_TIMEOUT', default=60 * 60 * 24)
@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from las.models import LiabilitiesType, SubjectAccumulation
+from las.services.tools.liabilities_type_registry import get_liabilities_type_registry
+from las.services.tools.subject_id_cache import get_subject_id_cache
+
+
+@receiver(post_save, sender=LiabilitiesType)
+@receiver(post_delete, sender=LiabilitiesType)
+def invalidate_liabilities_type_registry(sender, **kwargs):
+    get_liabilities_type_registry().invalidate_on_commit()
+
+
+@receiver(post_delete, sender=SubjectAccumulation)
+def invalidate_subject_id_cache(sender, instance: SubjectAccumulation, **kwargs):
+    subject_id_cache = get_subject_id_cache()
+    subject_id_cache.delete(instance.ogrn)
+    transaction.on_commit(lambda: subject_id_cache.delete(instance.ogrn))
@@ -7,6 +7,8 @@ from las.factories import InstanceFactory
 from las.models import User, LiabilitiesType
 from las.models.liabilities_type import TypeRunningChoices
 from las.services.las import LiabilityAccountingSystem
+from las.services.tools.liabilities_type_registry import get_liabilities_type_registry
+from las.services.tools.subject_id_cache import get_subject_id_cache
 from las.services.tools.subject_accumulation import SubjectAccumulationEntity, SubjectAccumulationManager
 
 
@@ -24,6 +26,13 @@ class TestsMixin:
             external_description=cls.name,
         )
 
+    def setUp(self):
+        # Откат транзакции теста не вызывает сигналы: реестр видов обязательств и кэш идентификаторов субъектов
+        # сбрасываются перед каждым тестом
+        super().setUp()
+        get_liabilities_type_registry().invalidate()
+        get_subject_id_cache().clear()
+
     @staticmethod
     def create_user(
             username='test',